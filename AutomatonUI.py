@@ -7,13 +7,19 @@ University of Houston
 """
 import tkinter as tk
 from tkinter import ttk
-import time
+from tkinter import filedialog
 import Board
+import MoveLog
+import Playback
+import Prefetch
+import TraceExport
+import Viewport
 
 class AutomatonUIApp:
 
     def __init__(self, master):
         self.board = Board.Board()
+        self.viewport = Viewport.Viewport(self.board.size)
         self.frameMain = tk.Frame(master, width=1920, height=1080, bd=1)
         self.frameMain.pack(side=tk.LEFT)
         self.canvasResult = tk.Canvas(self.frameMain, width=300, height=950)
@@ -39,30 +45,95 @@ class AutomatonUIApp:
         self.popupMenu = tk.OptionMenu(self.tab1, self.tkvar, *self.choices)
         self.tkvar.trace('w', self.SetPolyomino)
         self.popupMenu.pack(side=tk.TOP)
+
+        self.viewFrame = tk.Frame(self.tab1)
+        self.viewFrame.pack(side=tk.TOP)
+        tk.Button(self.viewFrame, text='+', width=2, command=lambda: self.Zoom(2)).pack(side=tk.LEFT)
+        tk.Button(self.viewFrame, text='-', width=2, command=lambda: self.Zoom(0.5)).pack(side=tk.LEFT)
+        tk.Button(self.viewFrame, text='Fit', command=self.FitView).pack(side=tk.LEFT)
+        self.followVar = tk.BooleanVar(master)
+        self.followCheck = tk.Checkbutton(self.tab1, text='Follow robot 1', variable=self.followVar,
+                                          command=self.DrawBoard)
+        self.followCheck.pack(side=tk.TOP)
+        self.canvasBoard.bind("<MouseWheel>", self.Wheel)
+        self.canvasBoard.bind("<Button-4>", self.Wheel) # Wheel on X11
+        self.canvasBoard.bind("<Button-5>", self.Wheel)
+        self.canvasBoard.bind("<ButtonPress-1>", self.StartPan)
+        self.canvasBoard.bind("<B1-Motion>", self.DragPan)
+
+        self.player = Playback.Player(master, self.ShowStep, self.board.GetMoveCount)
+        self.redrawJob = None # Slider moves waiting for one redraw
+        self.prefetcher = Prefetch.Prefetcher() # Renders bitmap frames around the slider off the Tk thread
+        self.speedFrame = tk.Frame(self.tab1)
+        self.speedFrame.pack(side=tk.TOP)
+        tk.Label(self.speedFrame, text="Steps/s").grid(row=0, column=0)
+        self.speedVar = tk.IntVar(master, Playback.STEPS_PER_SECOND)
+        tk.OptionMenu(self.speedFrame, self.speedVar, 1, 5, 15, 60, 250, 1000, 5000,
+                      command=self.SetSpeed).grid(row=0, column=1)
+        tk.Label(self.speedFrame, text="Steps/frame").grid(row=1, column=0)
+        self.frameVar = tk.IntVar(master, Playback.STEPS_PER_FRAME)
+        tk.OptionMenu(self.speedFrame, self.frameVar, 1, 2, 5, 10, 50, 100,
+                      command=self.SetSpeed).grid(row=1, column=1)
         
-        self.iterateButton = tk.Button(self.tab1, text='Iterate', command=self.Iterate)        
+        self.iterateButton = tk.Button(self.tab1, text='Play', command=self.Iterate)        
         self.iterateButton.pack(side=tk.BOTTOM)
         #self.iterateButton = tk.Button(self.controlFrame, text='Results!', command=self.GenerateResults)        
         #self.iterateButton.pack(side=tk.BOTTOM)
 
-        self.slider = tk.Scale(self.tab1, from_=0, to=Board.MAX_MOVES, orient=tk.VERTICAL, 
+        self.slider = tk.Scale(self.tab1, from_=0, to=self.board.budget, orient=tk.VERTICAL, 
                                resolution=1, length=800, sliderlength=20, command=self.SetCurrentStep)
         self.slider.pack(side=tk.BOTTOM)
+
+        # Jump between the episodes of a phase, a category or one of robot 1's states
+        self.phaseFrame = tk.Frame(self.tab1)
+        self.phaseFrame.pack(side=tk.BOTTOM)
+        self.phaseVar = tk.StringVar(master)
+        self.phaseVar.set(MoveLog.CATEGORIES[0])
+        tk.OptionMenu(self.phaseFrame, self.phaseVar, *(MoveLog.CATEGORIES + [state.name for state in Board.STATE]),
+                      command=lambda *args: self.ShowPhase()).grid(row=0, column=0, columnspan=3)
+        tk.Button(self.phaseFrame, text='<', width=2, command=lambda: self.JumpToPhase(-1)).grid(row=1, column=0)
+        tk.Button(self.phaseFrame, text='Longest', command=self.JumpToLongestPhase).grid(row=1, column=1)
+        tk.Button(self.phaseFrame, text='>', width=2, command=lambda: self.JumpToPhase(1)).grid(row=1, column=2)
+        self.phaseLabel = tk.Label(self.phaseFrame, text="")
+        self.phaseLabel.grid(row=2, column=0, columnspan=3)
         
         # Settings Tab
         self.axisButton = tk.Button(self.tab2, text='Hide Axes', command=self.ToggleShowAxes)        
         self.axisButton.pack(side=tk.TOP)
-        
+        self.exportButton = tk.Button(self.tab2, text='Export Trace', command=self.ExportTrace)
+        self.exportButton.pack(side=tk.TOP)
+        self.heatmapLabel = tk.Label(self.tab2, text = "Heatmap")
+        self.heatmapLabel.pack(side=tk.TOP)
+        self.heatmapVar = tk.StringVar(master)
+        self.heatmapVar.set("none")
+        self.heatmapMenu = tk.OptionMenu(self.tab2, self.heatmapVar, "none", *Board.HEATMAPS)
+        self.heatmapVar.trace('w', self.SetHeatmap)
+        self.heatmapMenu.pack(side=tk.TOP)
+        self.renderLabel = tk.Label(self.tab2, text = "Rendering")
+        self.renderLabel.pack(side=tk.TOP)
+        self.renderVar = tk.StringVar(master)
+        self.renderVar.set("auto")
+        self.renderMenu = tk.OptionMenu(self.tab2, self.renderVar, "auto", "shapes", "bitmap")
+        self.renderVar.trace('w', self.SetRendering)
+        self.renderMenu.pack(side=tk.TOP)
+        tk.Label(self.tab2, text = "Prefetch frames").pack(side=tk.TOP)
+        self.prefetchVar = tk.IntVar(master, Prefetch.AHEAD)
+        tk.OptionMenu(self.tab2, self.prefetchVar, 0, 8, 24, 96, command=self.SetPrefetch).pack(side=tk.TOP)
+
         self.SetPolyomino()
         
     
     def DrawBoard(self):
+        if self.followVar.get():
+            self.viewport.Follow(*self.board.robot1.position)
+        self.board.view = self.viewport.Window()
         self.canvasBoard.delete(tk.ALL)
         self.canvasResult.delete(tk.ALL)
-        self.board.Draw(self.canvasBoard,(800,800))
+        frame = self.prefetcher.Get(self.board, self.board.shownStep, (800,800))
+        self.board.Draw(self.canvasBoard,(800,800), frame=frame)
         self.board.ShowResults(self.canvasResult,(400,800))
-        self.canvasBoard.update()
-        self.canvasResult.update()
+        self.canvasBoard.update_idletasks()
+        self.canvasResult.update_idletasks()
 
 
     def Run(self):
@@ -72,31 +143,94 @@ class AutomatonUIApp:
         
     
     def SetCurrentStep(self, value):
-        step = self.slider.get()
-        self.board.SetStep(step)
+        # Drags fire for every value passed, only the latest one is drawn once Tk is idle
+        if self.redrawJob is None:
+            self.redrawJob = self.slider.after_idle(self.SeekSlider)
+
+
+    def SeekSlider(self):
+        self.redrawJob = None
+        self.player.Seek(self.slider.get())
+
+
+    def ShowStep(self, step):
+        previous = self.board.shownStep
+        self.board.StepTo(step) # Only the cells that changed since the step on screen
         self.DrawBoard()
+        if previous is not None and previous != step and self.board.UsesBitmap():
+            self.prefetcher.Request(self.board, step, (800,800), step - previous, abs(step - previous))
+        self.slider.set(step) # The slider's redraw is skipped, the player is already on this step
+        self.ShowPhase()
+        playing = self.player.IsPlaying() and step < self.board.GetMoveCount() - 1
+        self.iterateButton.config(text='Pause' if playing else 'Play')
     
     
     def SetPolyomino(self, *args):
         print(self.tkvar.get())
+        self.player.Pause()
+        self.iterateButton.config(text='Play')
+        self.prefetcher.Clear()
         self.board.SetPolyomino(self.tkvar.get())
+        self.player.step = 0
+        self.ShowPhase()
+        self.viewport.Reset(self.board.size)
         self.slider.set(0)
         self.slider.configure(to=self.board.GetMoveCount()-1) #Note the need to offset by 1 for one-off errors
         self.slider.update()
         self.DrawBoard()
         
-        for name,value in zip(["Initial Search", "Add/Shift Tile", "Delete Tile", "Move/Search"], self.board.results[4]):
+        for name,value in zip(MoveLog.CATEGORIES, self.board.finalResults[4]):
             print("{} - {}".format(name, value))
         
-        print("Total Moves: {}".format(sum(self.board.results[4])))
+        print("Total Moves: {}".format(sum(self.board.finalResults[4])))
 
     
     def Iterate(self):
-        for step in range(self.board.GetMoveCount()):
-            self.slider.set(step)
-            self.canvasBoard.update()
-            self.canvasResult.update()
-            time.sleep(1/15)
+        self.player.Toggle()
+        self.iterateButton.config(text='Pause' if self.player.IsPlaying() else 'Play')
+
+
+    def GetPhase(self):
+        """ The phase index and value picked in the phase menu """
+        name = self.phaseVar.get()
+        if name in MoveLog.CATEGORIES:
+            return self.board.log.GetPhases("category"), MoveLog.CATEGORIES.index(name)
+        return self.board.log.GetPhases("robot1"), Board.STATE[name].value
+
+
+    def ShowPhase(self):
+        phases, value = self.GetPhase()
+        count = phases.Count(value)
+        run = phases.At(self.player.step)
+        if count == 0:
+            text = "never"
+        elif phases.values[run] == value:
+            text = "episode {} of {}".format(phases.EpisodeNumber(run) + 1, count)
+        else:
+            text = "{} episodes, {:.1%} of steps".format(count, phases.Share()[value])
+        self.phaseLabel.config(text=text)
+
+
+    def JumpToPhase(self, direction):
+        phases, value = self.GetPhase()
+        if direction > 0:
+            k = phases.NextEpisode(value, self.player.step)
+        else:
+            k = phases.PreviousEpisode(value, self.player.step)
+        if k is not None:
+            self.player.Seek(phases.Episode(value, k)[0])
+
+
+    def JumpToLongestPhase(self):
+        phases, value = self.GetPhase()
+        longest = phases.Longest(value)
+        if longest is not None:
+            self.player.Seek(longest[0])
+
+
+    def SetSpeed(self, *args):
+        self.player.stepsPerSecond = self.speedVar.get()
+        self.player.stepsPerFrame = self.frameVar.get()
             
     
     def ToggleShowAxes(self):
@@ -110,7 +244,59 @@ class AutomatonUIApp:
             self.board.showAxes = False
 
         self.DrawBoard() # Redraw the board
-    
+
+
+    def SetHeatmap(self, *args):
+        kind = self.heatmapVar.get()
+        self.board.heatmap = None if kind == "none" else kind
+        self.DrawBoard() # Redraw the board
+
+
+    def SetPrefetch(self, *args):
+        self.prefetcher.ahead = self.prefetchVar.get()
+        self.prefetcher.behind = self.prefetcher.ahead // 3
+
+
+    def SetRendering(self, *args):
+        self.board.bitmap = {"auto": None, "shapes": False, "bitmap": True}[self.renderVar.get()]
+        self.DrawBoard() # Redraw the board
+
+
+    def Zoom(self, factor, cell=None):
+        self.viewport.Zoom(factor, cell)
+        self.DrawBoard()
+
+
+    def FitView(self):
+        self.viewport.Fit()
+        self.DrawBoard()
+
+
+    def Wheel(self, event):
+        factor = 1.25 if event.num == 4 or event.delta > 0 else 0.8
+        self.Zoom(factor, self.viewport.CellAt(event.x, event.y, (800,800), 20))
+
+
+    def StartPan(self, event):
+        self.panStart = (event.x, event.y)
+
+
+    def DragPan(self, event):
+        scale = 800 / self.viewport.span # Pixels per cell
+        dx, dy = event.x - self.panStart[0], event.y - self.panStart[1]
+        du, dv = int(-dx / scale), int(dy / scale) # Whole cells, the rest carries to the next motion
+        if du or dv:
+            self.viewport.Pan(du, dv)
+            self.panStart = (self.panStart[0] - du*scale, self.panStart[1] + dv*scale)
+            self.DrawBoard()
+
+
+    def ExportTrace(self):
+        path = filedialog.asksaveasfilename(defaultextension=".npz", initialfile="{}.npz".format(self.board.name),
+                                            filetypes=[("NumPy trace", "*.npz")])
+        if path:
+            TraceExport.ExportTrace(self.board, path)
+
             
     def GenerateResults(self):
         choices = ["single", "L02", "L04", "L08", "L16", "L32", "U02", "U04", "U08",
@@ -126,7 +312,7 @@ class AutomatonUIApp:
             self.slider.set(0)
             self.slider.update()
             self.DrawBoard()
-            print(self.board.results[4], sum(self.board.results[4]))
+            print(self.board.finalResults[4], sum(self.board.finalResults[4]))
         print("="*20)    
     
     
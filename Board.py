@@ -9,11 +9,16 @@ University of Houston
 import numpy as np
 import tkinter
 import MoveLog
-from operator import add
+import Precheck
+import Render
 from enum import Enum,auto
 import math
+import time
 
-MAX_MOVES = 30000
+BUDGET_BASE = 64 # Steps for the initial search and going home, single needs 20
+BUDGET_PER_CELL = 6.5 # Steps per unit of span*min(tiles, span), polyominoes up to 8 tiles and the presets need up to 6.1
+BUDGET_SAFETY = 1.5 # Default headroom on the budget
+WATCHDOG_STEPS = 1024 # Steps between looks at the clock
 NORTH = 1
 EAST = 2
 SOUTH = 4
@@ -22,6 +27,13 @@ MOVES = {NORTH:[0,1], EAST:[1,0], SOUTH:[0,-1], WEST:[-1,0]} # Deltas for moves
 BEHIND = {NORTH:SOUTH, EAST:WEST, SOUTH:NORTH, WEST:EAST}
 CLOCKWISE = {NORTH:EAST, EAST:SOUTH, SOUTH:WEST, WEST:NORTH} #Turn Right
 COUNTERCLOCKWISE = {NORTH:WEST, EAST:NORTH, SOUTH:EAST, WEST:SOUTH} #Turn Left
+HEADINGS = [NORTH, EAST, SOUTH, WEST] # Heading of each heading index, clockwise from North
+HEADING_INDEX = {heading: index for index, heading in enumerate(HEADINGS)}
+OFFSETS = [(0, 1), (1, 0), (0, -1), (-1, 0)] # Cell deltas by heading index
+AHEAD, RIGHT, BACK, LEFT = 0, 1, 2, 3 # Turns, added to a heading index modulo 4
+HEATMAPS = ["robot1", "robot2", "placed", "removed", "churn"]
+SHAPES_MAX_ITEMS = 2000 # Above this many tiles plus grid lines Draw switches to a bitmap
+GRIDS = ["tiles", "visits", "placements", "removals"] # Arrays a BoardSnapshot shares with its board
 
 class STATE(Enum):
     IDLE = auto()
@@ -60,38 +72,101 @@ class STATE(Enum):
     MARK_START = auto()
     MOVE_HOME = auto()
 
+class Robot:
+    """ A robot's cell, STATE and heading, updated in place as it moves.
+        The heading is held as an index into HEADINGS, OFFSETS and the turns. """
+    __slots__ = ("x", "y", "state", "direction")
+
+    def __init__(self, position, state, heading):
+        self.x, self.y = position
+        self.state = state
+        self.direction = HEADING_INDEX[heading]
+
+    @property
+    def heading(self):
+        """ NORTH, EAST, SOUTH or WEST """
+        return HEADINGS[self.direction]
+
+    @heading.setter
+    def heading(self, heading):
+        self.direction = HEADING_INDEX[heading]
+
+    @property
+    def position(self):
+        return (self.x, self.y)
+
+    def Copy(self):
+        robot = Robot.__new__(Robot)
+        robot.x, robot.y, robot.state, robot.direction = self.x, self.y, self.state, self.direction
+        return robot
+
+    def __eq__(self, other):
+        return (isinstance(other, Robot) and (self.x, self.y, self.state, self.direction) ==
+                (other.x, other.y, other.state, other.direction))
+
+    def __repr__(self):
+        return "Robot(({}, {}), {}, {})".format(self.x, self.y, self.state, self.heading)
+
+class STATUS(Enum):
+    RUNNING = auto()
+    FINISHED = auto()
+    EXHAUSTED = auto() # Used up the step budget before robot1 reached FINISH
+    TIMEOUT = auto() # Ran past timeLimit before robot1 reached FINISH
+    ERROR = auto()
+    REJECTED = auto() # Failed Precheck.CheckPlacement, never run
+
 class Board:
     def __init__(self, dims=(16,16)):
         """ Create a board of the dimension given """
-        self.robot1 = [[7,8], STATE.SEARCHSOUTH, SOUTH]   # Start at the location in state 1, facing South
-        self.robot2 = [[7,9], STATE.IDLE, SOUTH] # Start at the location in state 0, facing South
+        self.robot1 = Robot([7,8], STATE.SEARCHSOUTH, SOUTH)   # Start at the location in state 1, facing South
+        self.robot2 = Robot([7,9], STATE.IDLE, SOUTH) # Start at the location in state 0, facing South
         self.results = [0,0,0]
         self.size = dims        
         self.width, self.height = dims
         self.tiles = np.zeros(dims, dtype=int)
         self.log = MoveLog.MoveLog()
+        self.checker = None # Optional Invariants.InvariantChecker called after every Update
+        self.precheck = True # Validate tile sets with Precheck.CheckPlacement before running them
+        self.rejection = None # Reason the current tile set failed the precheck
+        self.budgetSafety = BUDGET_SAFETY # Headroom ComputeBudget gives each tile set
+        self.timeLimit = None # Seconds a single Stream may run for, no limit when None
+        self.verbose = True # Print progress and errors while generating
+        self.shownStep = None # Logged step the board is showing, None when it has moved on since
+        self.shared = set() # GRIDS a snapshot still shares, copied before the board writes to them
         self.SetPolyomino()
         self.SetStep(0) # Go back to the beginning
         self.showAxes = True # Show the numbers on the Axes
+        self.heatmap = None # Name from HEATMAPS to overlay when drawing
+        self.bitmap = None # Draw the tiles as one image, None to pick by the number of canvas items
+        self.view = None # Cells (u0, v0, u1, v1) to draw, the whole board when None
     
+    def GetWindow(self):
+        """ The cells (u0, v0, u1, v1) in view, the whole board unless view is set """
+        if self.view is None:
+            return (0, 0, self.width, self.height)
+        u0, v0, u1, v1 = self.view
+        u0, v0 = max(0, min(u0, self.width - 1)), max(0, min(v0, self.height - 1))
+        return (u0, v0, max(u0 + 1, min(u1, self.width)), max(v0 + 1, min(v1, self.height)))
+
     def _DrawGrid(self, canvas, size, offset):
-        deltaX = int(size[0]/self.width) #Change here for non square cells
-        deltaY = int(size[1]/self.height) #Change here for non square cells
-        for x in range(offset,self.width*deltaX+offset+1,deltaX): #Draw the simple outline
-            canvas.create_line(x, offset, x, self.height*deltaY+offset, 
+        u0, v0, u1, v1 = self.GetWindow()
+        deltaX = int(size[0]/(u1-u0)) #Change here for non square cells
+        deltaY = int(size[1]/(v1-v0)) #Change here for non square cells
+        for x in range(offset,(u1-u0)*deltaX+offset+1,deltaX): #Draw the simple outline
+            canvas.create_line(x, offset, x, (v1-v0)*deltaY+offset, 
                                fill='#c0c0c0')#Vertical lines
             
-        for y in range(offset,self.height*deltaY+offset+1,deltaY): #Draw the simple outline
-            canvas.create_line(offset, y, self.width*deltaX+offset, y, 
+        for y in range(offset,(v1-v0)*deltaY+offset+1,deltaY): #Draw the simple outline
+            canvas.create_line(offset, y, (u1-u0)*deltaX+offset, y, 
                                fill='#c0c0c0')#Horizontal lines
         
         
         if self.showAxes:
-            for x in range(self.width): # Draw the column numbers
-                loc = (x*deltaX+3*deltaX/4, self.height*deltaY+offset+5)
+            for x in range(u0, u1): # Draw the column numbers
+                loc = ((x-u0)*deltaX+3*deltaX/4, (v1-v0)*deltaY+offset+5)
                 canvas.create_text(loc, anchor='nw', text="{}".format(x))
-            for y in range(self.height): # Draw the row numbers
-                loc = (10,(self.height-y-1)*deltaY+3*deltaY/4)
+            for y in range(v0, v1): # Draw the row numbers
+                loc = (10,(v1-y-1)*deltaY+3*deltaY/4)
                 canvas.create_text(loc, anchor='nw', text="{}".format(y))
 
     def DrawDirection(self, canvas, x,y,dx,dy,direction):
@@ -106,33 +181,103 @@ class Board:
         
         canvas.create_polygon(points, outline='black', fill='white', width=1)
 
-    def Draw(self, canvas, size = (600,600), offset = 20):
+    def _DrawHeatmap(self, canvas, size, offset):
+        u0, v0, u1, v1 = self.GetWindow()
+        deltaX = int(size[0]/(u1-u0)) #Change here for non square cells
+        deltaY = int(size[1]/(v1-v0)) #Change here for non square cells
+        heat = self.GetHeatmap(self.heatmap)
+        if heat.max() == 0:
+            return
+        scale = np.log1p(heat)/np.log1p(heat.max()) # Log scale so the busiest cells don't wash out the rest
+        for u, v in (np.argwhere(heat[u0:u1, v0:v1] > 0) + (u0, v0)).tolist():
+            x = offset + (u-u0)*deltaX
+            y = offset + (v1-v-1)*deltaY # Flip the y
+            fade = int(255*(1 - scale[u,v]))
+            canvas.create_rectangle((x, y, x+deltaX, y+deltaY), width=0,
+                                    fill="#ff{0:02x}{0:02x}".format(fade)) # White to red
+
+    def _DrawRobot(self, canvas, robot, color, x, y, dx, dy):
+        if dx >= 8:
+            canvas.create_oval((x+2, y+2, x+dx-2, y+dy-2), fill=color)
+            self.DrawDirection(canvas, x, y, dx, dy, robot.heading)
+        else: # Too small for the heading, keep the robot visible
+            cx, cy = x + dx/2, y + dy/2
+            canvas.create_oval((cx-3, cy-3, cx+3, cy+3), fill=color, outline=color)
+
+    def DrawBitmap(self, canvas, size = (600,600), offset = 20, frame = None):
+        """ Draw the tiles as a single image with the robots and thinned axis numbers on top,
+            a constant number of canvas items whatever the size of the board. frame is the
+            (ppm, shape, scale) of these tiles when Prefetch has rendered them already. """
+        u0, v0, u1, v1 = window = self.GetWindow()
+        if frame is None:
+            heat = self.GetHeatmap(self.heatmap) if self.heatmap is not None else None
+            image, scale = Render.RenderTiles(self.tiles, window, size, heat)
+            image, shape = Render.PPM(image), image.shape
+        else:
+            image, shape, scale = frame
+        canvas.image = Render.PhotoImage(image, canvas) # Tk drops images nothing refers to
+        canvas.create_image(offset, offset, anchor='nw', image=canvas.image)
+        canvas.create_rectangle((offset, offset, offset + shape[1], offset + shape[0]),
+                                outline='#c0c0c0')
+
+        for robot, color in [(self.robot1, "red"), (self.robot2, "blue")]:
+            u, v = robot.position
+            if u0 <= u < u1 and v0 <= v < v1:
+                x = offset + (u-u0)*scale
+                y = offset + (v1-v-1)*scale # Flip the y
+                self._DrawRobot(canvas, robot, color, x, y, scale, scale)
+
+        if self.showAxes:
+            step = Render.LabelStep(scale)
+            for x in range(-(-u0 // step)*step, u1, step): # Draw the column numbers
+                loc = (offset + (x-u0)*scale + scale/2, offset + shape[0] + 5)
+                canvas.create_text(loc, anchor='n', text="{}".format(x))
+            for y in range(-(-v0 // step)*step, v1, step): # Draw the row numbers
+                loc = (offset - 5, offset + (v1-y-1)*scale + scale/2)
+                canvas.create_text(loc, anchor='e', text="{}".format(y))
+            canvas.create_text((20,18), anchor='sw', text="{}x{}".format(self.width,self.height))
+
+    def UsesBitmap(self):
+        """ Whether Draw will draw the tiles in view as one image """
+        if self.bitmap is not None:
+            return self.bitmap
+        u0, v0, u1, v1 = self.GetWindow()
+        return np.count_nonzero(self.tiles[u0:u1, v0:v1]) + (u1-u0) + (v1-v0) > SHAPES_MAX_ITEMS
+
+    def Draw(self, canvas, size = (600,600), offset = 20, frame = None):
+        """ Draw the board, frame is passed on to DrawBitmap """
+        u0, v0, u1, v1 = self.GetWindow()
+        if self.UsesBitmap():
+            self.DrawBitmap(canvas, size, offset, frame)
+            return
         self._DrawGrid(canvas, size, offset)
-        deltaX = int(size[0]/self.width) #Change here for non square cells
-        deltaY = int(size[1]/self.height) #Change here for non square cells
+        deltaX = int(size[0]/(u1-u0)) #Change here for non square cells
+        deltaY = int(size[1]/(v1-v0)) #Change here for non square cells
+        if self.heatmap is not None:
+            self._DrawHeatmap(canvas, size, offset)
         
-        for v in range(self.height):
-            for u in range(self.width):
-                if self.tiles[u,v] == 1:
-                    x = offset + u*deltaX 
-                    y = offset + (self.height-v-1)*deltaY #FLip the y
-                    canvas.create_rectangle((x+1, y+1, x+deltaX-1, y+deltaY-1), 
-                               fill="gray")
+        for u, v in (np.argwhere(self.tiles[u0:u1, v0:v1] == 1) + (u0, v0)).tolist(): # Only the tiles in view
+            x = offset + (u-u0)*deltaX 
+            y = offset + (v1-v-1)*deltaY #FLip the y
+            canvas.create_rectangle((x+1, y+1, x+deltaX-1, y+deltaY-1), 
+                       fill="gray", stipple="gray50" if self.heatmap is not None else "")
 
         # Draw both of the robots on the board
-        u, v = self.robot1[0]
-        x = offset + u*deltaX 
-        y = offset + (self.height-v-1)*deltaY # Flip the y
-        canvas.create_oval((x+2, y+2, x+deltaX-2, y+deltaY-2),fill="red")
-        self.DrawDirection(canvas, x, y, deltaX, deltaY, self.robot1[2])
-        #canvas.create_text((x+deltaX/2, y+deltaY/2), anchor='center', font=("Purisa", 14), text=str(self.robot1[1].value))
+        u, v = self.robot1.position
+        if u0 <= u < u1 and v0 <= v < v1:
+            x = offset + (u-u0)*deltaX 
+            y = offset + (v1-v-1)*deltaY # Flip the y
+            canvas.create_oval((x+2, y+2, x+deltaX-2, y+deltaY-2),fill="red")
+            self.DrawDirection(canvas, x, y, deltaX, deltaY, self.robot1.heading)
+            #canvas.create_text((x+deltaX/2, y+deltaY/2), anchor='center', font=("Purisa", 14), text=str(self.robot1.state.value))
         
-        u, v = self.robot2[0]
-        x = offset + u*deltaX 
-        y = offset + (self.height-v-1)*deltaY # Flip the y
-        canvas.create_oval((x+2, y+2, x+deltaX-2, y+deltaY-2),fill="blue")
-        self.DrawDirection(canvas, x, y, deltaX, deltaY, self.robot2[2])
-        #canvas.create_text((x+deltaX/2, y+deltaY/2), anchor='center', font=("Purisa", 14), text=str(self.robot2[1].value))
+        u, v = self.robot2.position
+        if u0 <= u < u1 and v0 <= v < v1:
+            x = offset + (u-u0)*deltaX 
+            y = offset + (v1-v-1)*deltaY # Flip the y
+            canvas.create_oval((x+2, y+2, x+deltaX-2, y+deltaY-2),fill="blue")
+            self.DrawDirection(canvas, x, y, deltaX, deltaY, self.robot2.heading)
+            #canvas.create_text((x+deltaX/2, y+deltaY/2), anchor='center', font=("Purisa", 14), text=str(self.robot2.state.value))
         
         if self.showAxes:
             canvas.create_text((20,18), anchor='sw', text="{}x{}".format(self.width,self.height))
@@ -147,28 +292,74 @@ class Board:
         
         # ToDo: Fix up the states into something more like a dictionary
         canvas.create_text((offset, 180), anchor='nw', font=("Purisa", 14), text="Robot 1:")
-        canvas.create_text((offset, 210), anchor='nw', font=("Purisa", 12), text="  {}".format(str(self.robot1[1])[6:]))
+        canvas.create_text((offset, 210), anchor='nw', font=("Purisa", 12), text="  {}".format(str(self.robot1.state)[6:]))
         canvas.create_text((offset, 240), anchor='nw', font=("Purisa", 14), text="Robot 2:")
-        canvas.create_text((offset, 270), anchor='nw', font=("Purisa", 12), text="  {}".format(str(self.robot2[1])[6:]))
+        canvas.create_text((offset, 270), anchor='nw', font=("Purisa", 12), text="  {}".format(str(self.robot2.state)[6:]))
 
         
     def Generate(self):
         """ Generate the initial tile setup. """
+        for delta in self.Stream():
+            pass
+        if self.verbose and self.status != STATUS.FINISHED:
+            print("Run {}: {}".format(self.status.name, self.statusMessage))
+        self.finalResults = self.results[:4] + [list(self.results[4])] # SetStep brings back step 0's counters
+            
+        self.SetStep(0) # Go back to the beginning
+
+
+    def Stream(self, record=True):
+        """ Run the simulation from the current state, yielding a delta for each step as it is produced.
+            A delta is a dict of the step, both robots as (x, y, heading, state), the step's tile
+            events as (kind, loc) and a copy of the results so far. With record False nothing is kept in
+            the log past the starting step, so memory stays constant however long the run is. """
+        self.status = STATUS.RUNNING
+        self.statusMessage = ""
+        self.shownStep = None
+        if self.rejection is not None:
+            self.status = STATUS.REJECTED
+            self.statusMessage = self.rejection
+            return
+        if self.CheckState(self.robot1, STATE.FINISH): # A resumed run that had already finished
+            self.status = STATUS.FINISHED
+            return
+        self.log.record = record
+        deadline = None if self.timeLimit is None else time.monotonic() + self.timeLimit
         try:
-            for i in range(MAX_MOVES): # Run out 100 steps in the sim
+            for i in range(self.log.currentStep - 1, self.budget): # Carry on from a resumed step
+                if deadline is not None and i % WATCHDOG_STEPS == 0 and time.monotonic() > deadline:
+                    self.status = STATUS.TIMEOUT
+                    self.statusMessage = "stopped after {} steps, over the {}s time limit".format(i, self.timeLimit)
+                    return
                 self.Update()
+                if self.checker is not None:
+                    self.checker.Check(self)
+                step = self.log.currentStep - 1
+                yield {"step": step,
+                       "robot1": (self.robot1.x, self.robot1.y, self.robot1.heading, self.robot1.state),
+                       "robot2": (self.robot2.x, self.robot2.y, self.robot2.heading, self.robot2.state),
+                       "events": self.log.GetStepEvents(step),
+                       "results": self.results[:4] + [list(self.results[4])]} # A copy, the board's keeps counting
                 if self.CheckState(self.robot1, STATE.FINISH):
-                    break
+                    self.status = STATUS.FINISHED
+                    return
+            self.status = STATUS.EXHAUSTED
+            self.statusMessage = "used up the budget of {} steps".format(self.budget)
         except Exception as e:
-            print("Something bad happened here!")
-            print(e)
-            
-        self.SetStep(0) # Go back to the beginning
+            self.status = STATUS.ERROR
+            self.statusMessage = str(e)
+            if self.verbose:
+                print("Something bad happened here!")
+                print(e)
+        finally:
+            self.log.record = True
         
     
     def Update(self):
+        if self.shared:
+            self._Own(*GRIDS)
         message = ""
-        loc =  tuple(self.robot1[0])
+        loc =  self.robot1.position
         
         # ********************************************************************************
         # Actions for Robot#2
@@ -252,15 +443,15 @@ class Board:
         # ********************************************************************************
         elif self.CheckState(self.robot1, STATE.SHIFT_UNDO):
             if not self.IsLeftEmpty(self.robot1):
-                locLeft = self.GetLocation(self.robot1, COUNTERCLOCKWISE[self.robot1[2]])
+                locLeft = self.GetRelative(self.robot1, LEFT)
                 self.RemoveTile(locLeft)
             else:
                 self.MoveRobotForward(self.robot1)
                 if self.IsLeftEmpty(self.robot1):
                     self.SetState(self.robot1, STATE.BACKTRACK)
                 else:
-                    self.PlaceTile(tuple(self.robot1[0])) # Place the tile in the space adjacent to the roobot then move onto it
-                    locLeft = self.GetLocation(self.robot1, COUNTERCLOCKWISE[self.robot1[2]])
+                    self.PlaceTile(self.robot1.position) # Place the tile in the space adjacent to the roobot then move onto it
+                    locLeft = self.GetRelative(self.robot1, LEFT)
                     self.RemoveTile(locLeft)
         # ********************************************************************************
         #
@@ -328,7 +519,7 @@ class Board:
                     self.SetState(self.robot1, STATE.SHIFT_BEGIN)
                 else:
                     if self.IsRobot2AtRightOfRobot1():
-                        locBack = self.GetLocation(self.robot1, BEHIND[self.robot1[2]])
+                        locBack = self.GetRelative(self.robot1, BACK)
                         self.PlaceTile(locBack) # Place a tile on the square that I left
                         self.SetState(self.robot1, STATE.FINISH)
                     # if Robot1 came from below, there is
@@ -391,7 +582,7 @@ class Board:
                 self.MoveRobotForward(self.robot1)
                 self.PlaceTile(loc)
                 self.MoveRobotForward(self.robot2)
-                locBack = self.GetLocation(self.robot2, BEHIND[self.robot2[2]])
+                locBack = self.GetRelative(self.robot2, BACK)
                 self.RemoveTile(locBack)
                 
         # ********************************************************************************
@@ -434,7 +625,7 @@ class Board:
             self.MoveRobotForward(self.robot1)
             if self.LookForRobot():
                 if self.IsRobot1BehindRobot2(): # we are in p
-                    self.robot1[2] = self.robot2[2] # Orient robot 1 to match robot 2
+                    self.robot1.direction = self.robot2.direction # Orient robot 1 to match robot 2
                     self.TurnRobotRight(self.robot2)
                     self.MoveRobotForward(self.robot2)
                     self.SetState(self.robot1, STATE.MOVE_PAST_ROBOT2)
@@ -512,16 +703,16 @@ class Board:
                 self.TurnRobotRight(self.robot1)
                 self.MoveRobotForward(self.robot1)
             elif not self.IsLeftEmpty(self.robot1):
-                locLeft = self.GetLocation(self.robot1, COUNTERCLOCKWISE[self.robot1[2]])
+                locLeft = self.GetRelative(self.robot1, LEFT)
                 self.RemoveTile(locLeft)
-                #locAhead = self.GetLocation(self.robot1, self.robot1[2])
+                #locAhead = self.GetRelative(self.robot1, AHEAD)
                 #self.PlaceTile(locAhead) # Place a tile on the square that I left
                 self.SetState(self.robot1, STATE.FORGEAHEAD_1)
                 #self.SetState(self.robot1, STATE.CHECKFORWARD)
             else:
                 self.MoveRobotForward(self.robot1)
                 if self.IsLeftEmpty(self.robot1): 
-                    self.PlaceTile(tuple(self.robot1[0])) # Place the tile in the space where the robot now is
+                    self.PlaceTile(self.robot1.position) # Place the tile in the space where the robot now is
                 self.SetState(self.robot1, STATE.SHIFT_BEGIN)
         # ********************************************************************************
         #
@@ -536,12 +727,12 @@ class Board:
                 self.MoveRobotForward(self.robot1)
                 # To Do: Chec here to see if a shif is needed to the left
                 #print("Stepped into the gap")
-                IsForwardEmpty = list(map(add, self.robot1[0], MOVES[self.robot1[2]]))
+                IsForwardEmpty = self.GetRelative(self.robot1, AHEAD)
                 if self.CheckCorrnerTile(IsForwardEmpty): # We are at a corner, proceed
-                    self.PlaceTile(tuple(self.robot1[0])) # Place the tile in the space where the robot now is
+                    self.PlaceTile(self.robot1.position) # Place the tile in the space where the robot now is
                     self.SetState(self.robot1, STATE.CLOSE_THE_GAP)
                 else: # We are not on a coner, shift to find one
-                    self.PlaceTile(tuple(self.robot1[0])) # Place the tile in the space where the robot now is
+                    self.PlaceTile(self.robot1.position) # Place the tile in the space where the robot now is
                     self.SetState(self.robot1, STATE.SHIFT_AND_CLOSE)
         
         # ********************************************************************************
@@ -556,7 +747,7 @@ class Board:
                 self.MoveRobotBackward(self.robot1)
                 self.RemoveTile(loc)
                 self.TurnRobotLeft(self.robot1)
-                IsForwardEmpty = tuple(map(add, self.robot1[0], MOVES[self.robot1[2]]))
+                IsForwardEmpty = self.GetRelative(self.robot1, AHEAD)
                 self.PlaceTile(IsForwardEmpty) # Place
                 self.TurnRobotRight(self.robot1)
                 #print("Keep Shifting")
@@ -576,7 +767,7 @@ class Board:
             if self.LookForRobot():
                 self.TurnRobotRight(self.robot1)
                 self.TurnRobotRight(self.robot1)
-                self.robot2[2] = self.robot1[2] # Share the orientation
+                self.robot2.direction = self.robot1.direction # Share the orientation
                 self.SetState(self.robot1, STATE.FOLLOW_ME_AND_DELETE)
         
         # ********************************************************************************
@@ -607,31 +798,42 @@ class Board:
         
 
     def LogResults(self,message):
-        if self.robot1[1] in [STATE.IDLE, STATE.SEARCHSOUTH, STATE.SEARCH_EAST_WEST]: # Initial Search States
+        if self.robot1.state in [STATE.IDLE, STATE.SEARCHSOUTH, STATE.SEARCH_EAST_WEST]: # Initial Search States
             self.results[4][0] +=1
-        if self.robot1[1] in [STATE.BUILDINGBB, STATE.FORGEAHEAD_0, STATE.FORGEAHEAD_1,STATE.FORGEAHEAD_2, STATE.SHIFT_BEGIN, 
+        if self.robot1.state in [STATE.BUILDINGBB, STATE.FORGEAHEAD_0, STATE.FORGEAHEAD_1,STATE.FORGEAHEAD_2, STATE.SHIFT_BEGIN, 
                       STATE.SHIFT_PICK_BLOCK, STATE.SHIFT_CONTINUE, STATE.SHIFT, STATE.CLOSE_THE_GAP, STATE.SHIFT_AHEAD, STATE.PEPARE_2_SHIFT_LEFT,
                       STATE.SHIFT_AND_CLOSE, STATE.TILE_MEMBERSHIP_MARKER_DECISION, STATE.SHIFT_VALIDATE_PLACEMENT]: # Building/Shifting States
             self.results[4][1] +=1
-        if self.robot1[1] in [STATE.SHIFT_UNDO, STATE.BACKTRACK, STATE.FOLLOW_ME_AND_DELETE]: # Delete States
+        if self.robot1.state in [STATE.SHIFT_UNDO, STATE.BACKTRACK, STATE.FOLLOW_ME_AND_DELETE]: # Delete States
             self.results[4][2] +=1
-        if self.robot1[1] in [STATE.FOLLOWBB_CW, STATE.FOLLOWBB_CW_LOOK4MARKER, STATE.CHECKFORWARD, 
+        if self.robot1.state in [STATE.FOLLOWBB_CW, STATE.FOLLOWBB_CW_LOOK4MARKER, STATE.CHECKFORWARD, 
                       STATE.FOLLOWBB_CW_COMPLETE, STATE.TILE_MEMBERSHIP_CHEAPCHECK, 
                       STATE.TILE_MEMBERSHIP_START_SEARCH, STATE.TILE_MEMBERSHIP_SEARCH, 
                       STATE.FIND_ROBOT2_TO_DELETE, STATE.MOVE_PAST_ROBOT2, STATE.BRIDGE, STATE.RETURN_2_BB, STATE.TILE_MEMBERSHIP_VALIDATE_MARKER]: # Move/SearchBB States
             self.results[4][3] +=1
         
-        self.log.LogState(self.tiles, self.robot1, self.robot2, " ", list(self.results))
+        self.log.LogState(self.tiles, self.robot1, self.robot2, " ", self.results)
 
 
 #STATE.FINISH = 10 # Do nothing here
 
+    def ComputeBudget(self, tile_set):
+        """ Steps a tile set may take, from its tile count and bounding box scaled by budgetSafety.
+            The span is the bounding box width plus height, a sparse shape is charged by its tiles. """
+        xs = [loc[0] for loc in tile_set]
+        ys = [loc[1] for loc in tile_set]
+        if not xs:
+            return BUDGET_BASE
+        span = (max(xs) - min(xs) + 1) + (max(ys) - min(ys) + 1)
+        return int(self.budgetSafety * (BUDGET_BASE + BUDGET_PER_CELL * span * min(len(xs), span)))
+
     def ComputeDims(self,preference):
         minimum = preference # To ensure andquate space 
         result = 2**math.ceil(math.log2(minimum)) + 8
         return (result, result)
 
-    def SetPolyomino(self, poly="simpleZ"):
+    def SetPolyomino(self, poly="simpleZ", generate=True):
+        self._Own("tiles")
         self.tiles.fill(0)
         start1 = [7,8]
         start2 = [7,9]
@@ -711,11 +913,13 @@ class Board:
                         (11,11), (12,11), (12,10), (12,9), (12,8), (12,7), (12,6)]
             dims = (20,20)
         elif poly == "MY_UH":
-            tile_set = [(3,12), (3,11), (3,10), (3,9), (3,8), (3,7), (4,7), (5,7), (6,7),
-                        (7,7), (7,8), (7,9), (7,10), (7,11), (7,12), # H
-                        (5,9), (5,8), (5,6), (5,5), (5,4), (5,3), (5,2), (6,5), (7,5),
-                        (8,5), (9,5), (9,6), (9,7), (9,8), (9,9), (9,4), (9,3), (9,2)]
-            dims = (16,16)
+            tile_set = [(4,13), (4,12), (4,11), (4,10), (4,9), (4,8), (5,8), (6,8), (7,8),
+                        (8,8), (8,9), (8,10), (8,11), (8,12), (8,13), # H
+                        (6,10), (6,9), (6,7), (6,6), (6,5), (6,4), (6,3), (7,6), (8,6),
+                        (9,6), (10,6), (10,7), (10,8), (10,9), (10,10), (10,5), (10,4), (10,3)]
+            start1 = [8,9]
+            start2 = [8,10]
+            dims = (18,18)
         elif poly == "backwardsC":
             tile_set = [(7,9), (7,8), (8,9), (9,9), (9,8), (9,7), (9,6), (9,5), (9,4),
                         (8,4), (7,4)]
@@ -774,40 +978,95 @@ class Board:
             start2 = [4,7]
             dims = (10,10)
         
+        self.SetTiles(tile_set, start1, start2, dims, poly, generate)
+
+    def SetTiles(self, tile_set, start1, start2, dims, name="custom", generate=True):
+        """ Place an explicit set of tiles and robot starts on a board of size dims and generate """
         # Establish the board state
+        self.name = name
         self.log.Reset()
-        self.robot1 = [start1, STATE.SEARCHSOUTH, SOUTH]   # Start at the location in state 1, facing South
-        self.robot2 = [start2, STATE.IDLE, SOUTH] # Start at the location in state 0, facing South
+        self.robot1 = Robot(start1, STATE.SEARCHSOUTH, SOUTH)   # Start at the location in state 1, facing South
+        self.robot2 = Robot(start2, STATE.IDLE, SOUTH) # Start at the location in state 0, facing South
         self.results = [0,0,0,0,[0,0,0,0]]
+        self.finalResults = [0,0,0,0,[0,0,0,0]] # Counters at the end of the last Generate
         self.size = dims
         #print("The size is:", self.size)
         self.width, self.height = dims
         self.tiles = np.zeros(dims, dtype=int)
+        # Heatmaps for the whole run, see GetHeatmap
+        self.visits = np.zeros((2,) + tuple(dims), dtype=np.int32)
+        self.placements = np.zeros(dims, dtype=np.int32)
+        self.removals = np.zeros(dims, dtype=np.int32)
+        self.shared = set()
         
+        self.rejection = Precheck.CheckPlacement(tile_set, start1, start2, dims) if self.precheck else None
+        self.budget = self.ComputeBudget(tile_set)
         for point in tile_set: # set the tiles
-            self.tiles[point] = 1
+            if self.rejection is None or (0 <= point[0] < self.width and 0 <= point[1] < self.height):
+                self.tiles[point] = 1
         
         self.LogResults("Initial Board State")
-        print("Board Created: {} - size:{}".format(poly,self.size))
-        self.Generate()
+        self.shownStep = 0
+        if self.verbose:
+            print("Board Created: {} - size:{}".format(name,self.size))
+        if generate:
+            self.Generate()
 
     def SetStep(self, step):
+        self._Own("tiles")
         self.tiles.fill(0)
-        tile_list, self.robot1, self.robot2, message, self.results = self.log.GetStep(step)
+        tile_list, robot1, robot2, message, results = self.log.GetStep(step)
+        self.robot1, self.robot2 = robot1.Copy(), robot2.Copy() # The robots move in place, leave the log's alone
+        self.results = results[:4] + [list(results[4])]
         self.results[0] = step
         for loc in tile_list:
             self.tiles[loc] = 1
+        self.shownStep = step
         
-        return self.robot1[1] == STATE.FINISH
+        return self.robot1.state == STATE.FINISH
+
+    def StepTo(self, step):
+        """ Go to a logged step by changing only what differs from the step on show,
+            a step back or forward is O(1) where SetStep rebuilds the whole board """
+        if self.shownStep is None:
+            return self.SetStep(step)
+        self.ApplyDelta(self.log.GetDelta(self.shownStep, step))
+        return self.robot1.state == STATE.FINISH
+
+    def ApplyDelta(self, delta, reverse=False):
+        """ Take the board from one step of a MoveLog.GetDelta to the other, back again with reverse """
+        side = 0 if reverse else 1
+        self._Own("tiles")
+        for loc, before, after in delta["tiles"]:
+            self.tiles[loc] = (before, after)[side]
+        for robot, change in zip((self.robot1, self.robot2), delta["robots"]):
+            x, y, heading, state = change[side]
+            robot.x, robot.y = x, y
+            robot.heading = heading
+            robot.state = STATE(state)
+        counters = delta["counters"][side]
+        self.results = counters[:4] + [counters[4:]]
+        self.shownStep = (delta["from"], delta["step"])[side]
+
+    def Snapshot(self, step=None):
+        """ A read-only BoardSnapshot of the board as it is, or of a logged step """
+        return BoardSnapshot(self, step)
+
+    def _Own(self, *names):
+        """ Copy the named grids a snapshot shares before writing to them """
+        for name in names:
+            if name in self.shared:
+                setattr(self, name, getattr(self, name).copy())
+                self.shared.discard(name)
 
             
     def SetState(self, robot, state):
         """ Set the state of the specified robot """
-        robot[1] = state
+        robot.state = state
     
     
     def CheckState(self, robot, state):
-        return robot[1] == state
+        return robot.state == state
 
              
     def SearchSouth(self):
@@ -858,8 +1117,8 @@ class Board:
             
     def CheckCorrnerTile(self, loc):
         tile_hits = []
-        for direction in MOVES:
-            temp = tuple(map(add, loc, MOVES[direction]))
+        for direction, (dx, dy) in MOVES.items():
+            temp = (loc[0] + dx, loc[1] + dy)
             if self.tiles[temp] == 1:
                 tile_hits.append(direction)
         
@@ -871,97 +1130,119 @@ class Board:
   
     def PlaceTile(self, loc):
         """ Place a tile at the tuple location. """
+        self.log.LogEvent(MoveLog.PLACE, loc, self.tiles[loc])
         self.tiles[loc] = 1
         self.results[2] +=1
+        self.placements[loc] += 1
     
     
     def RemoveTile(self, loc):
         """ Remove a tile from the tuple location. """ # ToDo: Add in a check to see if there is a tile there?
+        self.log.LogEvent(MoveLog.REMOVE, loc, self.tiles[loc])
         self.tiles[loc] = 0
         self.results[3] +=1
+        self.removals[loc] += 1
     
     
     def MoveRobot(self, robot, direction):
+        """ Move a robot one cell NORTH, EAST, SOUTH or WEST """
+        self._StepRobot(robot, HEADING_INDEX[direction])
+    
+    
+    def _StepRobot(self, robot, index):
         #print("Look! {}".format(robot))
-        robot[0] = list(map(add, robot[0], MOVES[direction]))
+        dx, dy = OFFSETS[index]
+        robot.x += dx
+        robot.y += dy
         self.results[1] += 1
+        x, y = robot.x, robot.y
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.visits[0 if robot is self.robot1 else 1, x, y] += 1
     
     
     def GetLocation(self, robot, direction):
-        return tuple(map(add, robot[0], MOVES[direction]))
+        """ The cell NORTH, EAST, SOUTH or WEST of a robot """
+        dx, dy = MOVES[direction]
+        return (robot.x + dx, robot.y + dy)
+    
+    
+    def GetRelative(self, robot, turn):
+        """ The cell AHEAD, RIGHT, BACK or LEFT of a robot for its heading """
+        dx, dy = OFFSETS[(robot.direction + turn) & 3]
+        return (robot.x + dx, robot.y + dy)
     
     
     def MoveRobotForward(self, robot):
-        self.MoveRobot(robot, robot[2])
+        self._StepRobot(robot, robot.direction)
     
     
     def MoveRobotBackward(self, robot):
-        self.MoveRobot(robot, BEHIND[robot[2]])
+        self._StepRobot(robot, (robot.direction + BACK) & 3)
     
     
     def TurnRobotRight(self, robot):
-        robot[2] = CLOCKWISE[robot[2]]
+        robot.direction = (robot.direction + RIGHT) & 3
     
     
     def TurnRobotLeft(self, robot):
-        robot[2] = COUNTERCLOCKWISE[robot[2]]
+        robot.direction = (robot.direction + LEFT) & 3
     
     
     def LookForRobot(self):
-        distance = abs(self.robot1[0][0] - self.robot2[0][0]) + abs(self.robot1[0][1] - self.robot2[0][1])
+        distance = abs(self.robot1.x - self.robot2.x) + abs(self.robot1.y - self.robot2.y)
         return distance == 1
     
     
     def IsRobot1BehindRobot2(self):
-        loc = self.GetLocation(self.robot2, BEHIND[self.robot2[2]])
-        return loc == tuple(self.robot1[0])
+        loc = self.GetRelative(self.robot2, BACK)
+        return loc == self.robot1.position
     
     def IsRobot2BehindRobot1(self):
-        loc = self.GetLocation(self.robot1, BEHIND[self.robot1[2]])
-        return loc == tuple(self.robot2[0])
+        loc = self.GetRelative(self.robot1, BACK)
+        return loc == self.robot2.position
     
     def IsRobot2AtRightOfRobot1(self):
-        loc = self.GetLocation(self.robot1, CLOCKWISE[self.robot1[2]])
-        return loc == tuple(self.robot2[0])
+        loc = self.GetRelative(self.robot1, RIGHT)
+        return loc == self.robot2.position
     
     def IsRobot2AtLeftOfRobot1(self):
-        loc = self.GetLocation(self.robot1, COUNTERCLOCKWISE[self.robot1[2]])
-        return loc == tuple(self.robot2[0])
+        loc = self.GetRelative(self.robot1, LEFT)
+        return loc == self.robot2.position
     
     def IsRobot2FacingRobot1(self):
-        loc = self.GetLocation(self.robot1, self.robot1[2])
-        return loc == tuple(self.robot2[0])
+        loc = self.GetRelative(self.robot1, AHEAD)
+        return loc == self.robot2.position
     
     def IsForwardEmpty(self, robot):
         """ Returns true if the space ahead is open """
-        loc = self.GetLocation(robot, robot[2])
+        loc = self.GetRelative(robot, AHEAD)
         return self.tiles[loc] == 0
     
     def IsThisEmpty(self, robot):
-        loc = tuple(robot[0])
+        loc = robot.position
         return self.tiles[loc] == 0
     
     
     def IsBackwardEmpty(self, robot):
         """ Returns true if the space behind the robot is open """
-        loc = self.GetLocation(robot, BEHIND[robot[2]])
-        return self.tiles[loc] == 0 and tuple(self.robot2[0]) != loc
+        loc = self.GetRelative(robot, BACK)
+        return self.tiles[loc] == 0 and self.robot2.position != loc
     
     
     def IsLeftEmpty(self, robot):
         """ Returns true if the space to the left of the robot is open """
-        loc = self.GetLocation(robot, COUNTERCLOCKWISE[robot[2]])
-        return self.tiles[loc] == 0 and tuple(self.robot2[0]) != loc
+        loc = self.GetRelative(robot, LEFT)
+        return self.tiles[loc] == 0 and self.robot2.position != loc
     
     
     def IsRightEmpty(self, robot):
         """ Returns true if the space to the right of the robot is open """
-        loc = self.GetLocation(robot, CLOCKWISE[robot[2]])
-        return self.tiles[loc] == 0 and tuple(self.robot2[0]) != loc
+        loc = self.GetRelative(robot, RIGHT)
+        return self.tiles[loc] == 0 and self.robot2.position != loc
     
     def Look4TileRight(self, robot):
         """ Returns true if there is no tile to the right of the robot """
-        loc = self.GetLocation(robot, CLOCKWISE[robot[2]])
+        loc = self.GetRelative(robot, RIGHT)
         return self.tiles[loc] == 0
     
     def CountNeighbors(self, robot):
@@ -981,6 +1262,109 @@ class Board:
                         u"\u229008", u"\u229016", u"\u229032", "NASA", "TestV", "Spiral", "Temple",
                         "MIT", "TUBS", "Shrine"])
                 
+    def GetHeatmap(self, kind):
+        """ Per cell counts for the whole run, kind is one of HEATMAPS """
+        if kind == "robot1":
+            return self.visits[0]
+        elif kind == "robot2":
+            return self.visits[1]
+        elif kind == "placed":
+            return self.placements
+        elif kind == "removed":
+            return self.removals
+        elif kind == "churn":
+            return self.placements + self.removals
+        raise ValueError("unknown heatmap {!r}, expected one of {}".format(kind, ", ".join(HEATMAPS)))
+                
     def GetMoveCount(self):
         return self.log.GetStepCount()
+
+
+def _ReadOnly(name):
+    def Refuse(self, *args, **kwargs):
+        raise TypeError("BoardSnapshot is read-only, {} would change it".format(name))
+    Refuse.__name__ = name
+    return Refuse
+
+
+class FrozenRobot(Robot):
+    """ A robot that cannot be moved, what a BoardSnapshot holds. Copy gives a Robot that can. """
+    __slots__ = ()
+
+    def __init__(self, robot):
+        for name in Robot.__slots__:
+            object.__setattr__(self, name, getattr(robot, name))
+
+    def __setattr__(self, name, value):
+        raise TypeError("FrozenRobot is read-only, {} cannot be set".format(name))
+
+    def __delattr__(self, name):
+        raise TypeError("FrozenRobot is read-only, {} cannot be deleted".format(name))
+
+    def __reduce__(self):
+        return FrozenRobot, (self.Copy(),)
+
+
+class BoardSnapshot(Board):
+    """ A frozen copy of a board for other threads and processes, with the same sensors,
+        CountNeighbors and drawing as Board. The grids are shared with the board it was
+        taken from, which copies any of them before it next writes to it. The robots
+        are FrozenRobots, the results nested tuples and no attribute can be set once it
+        is made. A snapshot of a logged step has its own tiles and no heatmaps. """
+    MUTATORS = ["Generate", "Stream", "Update", "LogResults", "SetPolyomino", "SetTiles", "SetStep",
+                "StepTo", "ApplyDelta", "SetState", "PlaceTile", "RemoveTile", "MoveRobot", "_StepRobot",
+                "MoveRobotForward", "MoveRobotBackward", "TurnRobotRight", "TurnRobotLeft"]
+
+    def __init__(self, board, step=None):
+        """ Snapshot board as it is now, or step from its log """
+        if step is None:
+            grids = {name: getattr(board, name) for name in GRIDS}
+            robot1, robot2, results = board.robot1, board.robot2, board.results
+            board.shared.update(GRIDS)
+        else: # The run's heatmaps are not the step's, leave them out
+            tile_list, robot1, robot2, message, results = board.log.GetStep(step)
+            tiles = np.zeros(board.size, dtype=int)
+            for loc in tile_list:
+                tiles[loc] = 1
+            grids = dict.fromkeys(GRIDS)
+            grids["tiles"] = tiles
+        for name, grid in grids.items():
+            if grid is not None:
+                grid = grid.view()
+                grid.flags.writeable = False
+            setattr(self, name, grid)
+        self.robot1, self.robot2 = FrozenRobot(robot1), FrozenRobot(robot2)
+        self.results = (results[0] if step is None else step,) + tuple(results[1:4]) + (tuple(results[4]),)
+        self.shownStep = board.shownStep if step is None else step
+        for name in ["name", "size", "width", "height", "budget", "status", "statusMessage",
+                     "showAxes", "heatmap", "bitmap", "view"]:
+            setattr(self, name, getattr(board, name, None))
+        if step is not None:
+            self.heatmap = None
+        self.shared = set()
+        self.log = None # The board's log keeps growing, a snapshot only has its own step
+        self.checker = None
+        self.verbose = False
+        self.frozen = True # From here on nothing can be set
+
+    def __setattr__(self, name, value):
+        if getattr(self, "frozen", False):
+            raise TypeError("BoardSnapshot is read-only, {} cannot be set".format(name))
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        raise TypeError("BoardSnapshot is read-only, {} cannot be deleted".format(name))
+
+    def __setstate__(self, state):
+        """ Unpickled in another process the grids are copies, freeze them again """
+        self.__dict__.update(state)
+        for name in GRIDS:
+            if state[name] is not None:
+                state[name].flags.writeable = False
+
+    def GetMoveCount(self):
+        raise TypeError("BoardSnapshot has no log, ask the board it was taken from")
+
+for name in BoardSnapshot.MUTATORS:
+    setattr(BoardSnapshot, name, _ReadOnly(name))
     
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoint and resume for long running simulations.
+
+A checkpoint holds the working state of a Board (tiles, both robots, results)
+and its log columns in a versioned compressed .npz. The log snapshots are
+rebuilt from the starting tiles and the tile events on load, so a resumed run
+carries on bit for bit the same as one that was never interrupted.
+
+Usage:
+    python Checkpoint.py run L32 run.npz --every 5000
+    python Checkpoint.py resume run.npz --every 5000
+Send SIGUSR1 to write a checkpoint right away, SIGTERM or SIGINT to write one and stop.
+"""
+import argparse
+import os
+import signal
+import sys
+
+import numpy as np
+
+import Board
+import MoveLog
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_EVERY = 10000 # Steps between checkpoints
+
+
+def RobotArray(robot):
+    return np.array([robot.x, robot.y, robot.state.value, robot.heading], dtype=np.int64)
+
+
+def ArrayRobot(values):
+    x, y, state, heading = values.tolist()
+    return Board.Robot((x, y), Board.STATE(state), heading)
+
+
+def SaveCheckpoint(board, path):
+    """ Write the board's working state to path, replacing any earlier checkpoint atomically """
+    log = board.log
+    state = dict(version=CHECKPOINT_VERSION,
+                 name=board.name,
+                 dims=np.array(board.size),
+                 tiles=np.packbits(board.tiles.astype(bool), axis=None),
+                 robot1=RobotArray(board.robot1),
+                 robot2=RobotArray(board.robot2),
+                 results=np.array(board.results[1:4] + board.results[4], dtype=np.int64),
+                 currentStep=log.currentStep,
+                 visits=board.visits,
+                 placements=board.placements,
+                 removals=board.removals,
+                 initialTiles=np.array(log.GetStep(0)[0], dtype=np.int32).reshape(-1, 2))
+    state.update(log.GetColumns())
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        np.savez_compressed(f, **state)
+    os.replace(temp, path)
+
+
+def LoadCheckpoint(path, board=None):
+    """ Restore a checkpoint into board (a new one by default) ready for Generate or Stream to carry on """
+    with np.load(path) as data:
+        state = {key: data[key] for key in data.files}
+    if int(state["version"]) != CHECKPOINT_VERSION:
+        raise ValueError("Unsupported checkpoint version {} in {}".format(int(state["version"]), path))
+
+    if board is None:
+        board = Board.Board()
+    dims = tuple(state["dims"].tolist())
+    board.name = str(state["name"])
+    board.rejection = None # Only checkpoints of runs that passed the precheck exist
+    board.shownStep = None
+    board.shared = set() # Fresh grids below, snapshots keep the old ones
+    board.budget = board.ComputeBudget(state["initialTiles"].tolist())
+    board.size = dims
+    board.width, board.height = dims
+    board.tiles = np.unpackbits(state["tiles"], count=dims[0]*dims[1]).reshape(dims).astype(int)
+    board.robot1 = ArrayRobot(state["robot1"])
+    board.robot2 = ArrayRobot(state["robot2"])
+    results = state["results"].tolist()
+    board.results = [0] + results[:3] + [results[3:]]
+    # Heatmaps, checkpoints written before they existed start them from zero
+    board.visits = state.get("visits", np.zeros((2,) + dims, dtype=np.int32))
+    board.placements = state.get("placements", np.zeros(dims, dtype=np.int32))
+    board.removals = state.get("removals", np.zeros(dims, dtype=np.int32))
+
+    log = board.log
+    log.Reset()
+    log.SetColumns({name: state[name] for name in MoveLog.STEP_COLUMNS + MoveLog.EVENT_COLUMNS})
+    log.currentStep = len(state["counters"]) # The recorded steps, later ones ran with record off
+    RebuildSnapshots(log, state["initialTiles"], dims)
+    log.currentStep = int(state["currentStep"])
+    return board
+
+
+def RebuildSnapshots(log, initialTiles, dims):
+    """ Replay the tile events over the starting tiles to refill the per step snapshots """
+    tiles = np.zeros(dims, dtype=int)
+    tiles[tuple(initialTiles.T)] = 1
+    eventSteps, eventKinds, eventCells = log.GetEvents()
+    bounds = np.searchsorted(eventSteps, np.arange(len(log.GetCounters()) + 1))
+    counters = log.GetCounters().tolist()
+    positions = log.GetRobotPositions().tolist()
+    headings = log.GetRobotHeadings().tolist()
+    states = log.GetRobotStates().tolist()
+    for step in range(len(counters)):
+        for i in range(bounds[step], bounds[step + 1]):
+            tiles[tuple(eventCells[i])] = eventKinds[i]
+        vs, us = np.nonzero(tiles.T == 1)
+        robots = [Board.Robot(positions[step][n], Board.STATE(states[step][n]), headings[step][n]) for n in range(2)]
+        values = counters[step]
+        log.log[step] = (list(zip(us.tolist(), vs.tolist())), robots[0], robots[1], " ",
+                         [0] + values[1:4] + [values[4:]])
+
+
+def RunWithCheckpoints(board, path, every=CHECKPOINT_EVERY):
+    """ Carry on generating the board, checkpointing every so many steps and when signalled.
+        SIGUSR1 writes a checkpoint, SIGTERM and SIGINT write one and stop. Returns the board status. """
+    requested = {"save": False, "stop": False}
+
+    def Save(signum, frame):
+        requested["save"] = True
+
+    def Stop(signum, frame):
+        requested["save"] = requested["stop"] = True
+
+    handlers = {signal.SIGTERM: Stop, signal.SIGINT: Stop}
+    if hasattr(signal, "SIGUSR1"):
+        handlers[signal.SIGUSR1] = Save
+    previous = {signum: signal.signal(signum, handler) for signum, handler in handlers.items()}
+    try:
+        for delta in board.Stream():
+            if delta["step"] % every == 0 or requested["save"]:
+                SaveCheckpoint(board, path)
+                requested["save"] = False
+            if requested["stop"]:
+                break
+        else:
+            SaveCheckpoint(board, path) # The finished state
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+    return board.status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a polyomino with checkpoints, or resume one.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run")
+    run.add_argument("poly")
+    run.add_argument("path")
+    resume = commands.add_parser("resume")
+    resume.add_argument("path")
+    for command in (run, resume):
+        command.add_argument("--every", type=int, default=CHECKPOINT_EVERY)
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        board = Board.Board()
+        board.SetPolyomino(args.poly, generate=False)
+    else:
+        board = LoadCheckpoint(args.path)
+    status = RunWithCheckpoints(board, args.path, args.every)
+    print("{}: {} after {} steps".format(board.name, status.name, board.log.currentStep))
+    return 0 if status == Board.STATUS.FINISHED else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Differential cost regression runner between two versions of the automaton.
+
+Each side is a directory holding the sources or a git revision of this
+repository, exported whole so Board imports that revision's modules. Both are run over the same shapes in separate worker pools
+and every shape is reported with its change in total moves, the results[4]
+categories, the final configuration and the first step where the runs part.
+
+Usage:
+    python DiffRunner.py HEAD~1 HEAD
+    python DiffRunner.py /path/to/old/checkout . --shapes L08 SQ16 C08
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import Worker
+from MoveLog import CATEGORIES
+
+
+def CheckoutRevision(revision, repo="."):
+    """ Export the whole tree of a git revision to a new temporary directory, returns its path """
+    target = tempfile.mkdtemp(prefix="board-{}-".format(revision.replace("/", "_")))
+    archive = subprocess.run(["git", "archive", "--format=tar", revision], cwd=repo,
+                             check=True, capture_output=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(target)
+    return target
+
+
+def ResolveVersion(version, repo=".", temporary=None):
+    """ A directory is used as it is, anything else is taken as a git revision.
+        Directories made for revisions are added to the temporary list for removal. """
+    if os.path.isdir(version):
+        return os.path.abspath(version)
+    path = CheckoutRevision(version, repo)
+    if temporary is not None:
+        temporary.append(path)
+    return path
+
+
+def _InitWorker(path):
+    """ Put a version first on sys.path and make the worker's board from its Board """
+    sys.path.insert(0, path)
+    for name in os.listdir(path): # A forked worker may have inherited the parent's copies of any of them
+        if name.endswith(".py"):
+            sys.modules.pop(name[:-3], None)
+    Worker.Init()
+
+
+def RobotKey(robot):
+    """ Position, state name and heading of a logged robot, either a Board.Robot or an older [[x, y], STATE, heading] """
+    if isinstance(robot, list):
+        return (tuple(robot[0]), robot[1].name, robot[2])
+    return ((robot.x, robot.y), robot.state.name, robot.heading)
+
+
+def StepKey(step):
+    """ A digest of one logged step: tiles, robots and the move/place/pick counters.
+        The categories are left out, older logs shared one results[4] list between all steps. """
+    tile_list, robot1, robot2, message, results = step
+    robots = [RobotKey(robot) for robot in (robot1, robot2)]
+    counters = list(results[1:4])
+    return hashlib.blake2b(repr((sorted(tile_list), robots, counters)).encode(), digest_size=8).digest()
+
+
+def _RunShape(name):
+    """ Run one shape, returns its counters, final tiles and one digest per step """
+    board = Worker.GetBoard()
+    with contextlib.redirect_stdout(io.StringIO()): # Older versions print however verbose is set
+        board.SetPolyomino(name)
+    steps = board.GetMoveCount()
+    log = [board.log.GetStep(step) for step in range(steps)]
+    final = log[-1]
+    return {"name": name,
+            "steps": steps,
+            "robotMoves": final[4][1],
+            "categories": list(final[4][4]),
+            "final": sorted(final[0]),
+            "robots": [RobotKey(robot) for robot in final[1:3]],
+            "keys": b"".join(StepKey(step) for step in log)}
+
+
+def RunVersions(paths, shapes, processes=None):
+    """ Run the shapes on every version at the same time, returns one {name: run} per version """
+    pools = [ProcessPoolExecutor(processes, initializer=_InitWorker, initargs=(path,)) for path in paths]
+    try:
+        futures = [[pool.submit(_RunShape, name) for name in shapes] for pool in pools]
+        return [{future.result()["name"]: future.result() for future in version} for version in futures]
+    finally:
+        for pool in pools:
+            pool.shutdown()
+
+
+def FirstDivergence(old, new):
+    """ The first step whose digest differs, None when the runs are the same """
+    size = 8
+    for step in range(min(len(old), len(new)) // size):
+        if old[step*size:(step+1)*size] != new[step*size:(step+1)*size]:
+            return step
+    if len(old) != len(new):
+        return min(len(old), len(new)) // size
+    return None
+
+
+def Compare(oldRuns, newRuns):
+    """ Per shape differences, returns a list of dicts for the shapes that changed """
+    changes = []
+    for name, old in oldRuns.items():
+        new = newRuns[name]
+        diverged = FirstDivergence(old["keys"], new["keys"])
+        if diverged is None:
+            continue
+        changes.append({"name": name,
+                        "moves": (sum(old["categories"]), sum(new["categories"])),
+                        "robotMoves": (old["robotMoves"], new["robotMoves"]),
+                        "categories": list(zip(old["categories"], new["categories"])),
+                        "finalChanged": old["final"] != new["final"] or old["robots"] != new["robots"],
+                        "diverged": diverged})
+    return changes
+
+
+def PrintReport(changes, shapes):
+    print("{} of {} shapes changed".format(len(changes), len(shapes)))
+    if not changes:
+        return
+    print("{:<12}{:>10}{:>10}{:>8}{:>12}{:>10}  {}".format("Shape", "Old", "New", "Delta", "Robot moves",
+                                                          "Diverged", "Final"))
+    print("="*76)
+    for change in sorted(changes, key=lambda c: c["moves"][1] - c["moves"][0], reverse=True):
+        old, new = change["moves"]
+        oldMoves, newMoves = change["robotMoves"]
+        print("{:<12}{:>10}{:>10}{:>+8}{:>+12}{:>10}  {}".format(change["name"], old, new, new - old,
+                                                                newMoves - oldMoves, change["diverged"],
+                                                                "changed" if change["finalChanged"] else "same"))
+        for category, (oldCount, newCount) in zip(CATEGORIES, change["categories"]):
+            if oldCount != newCount:
+                print("    {:<18}{:>8}{:>10}{:>+8}".format(category, oldCount, newCount, newCount - oldCount))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare move costs of two automaton versions.")
+    parser.add_argument("old", help="Directory with the sources, or a git revision")
+    parser.add_argument("new", help="Directory with the sources, or a git revision")
+    parser.add_argument("--shapes", nargs="+", help="Shapes to run, every GetChoices entry by default")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--repo", default=os.path.dirname(os.path.abspath(__file__)))
+    args = parser.parse_args(argv)
+
+    temporary = []
+    try:
+        oldPath = ResolveVersion(args.old, args.repo, temporary)
+        newPath = ResolveVersion(args.new, args.repo, temporary)
+        shapes = args.shapes
+        if not shapes:
+            with contextlib.redirect_stdout(io.StringIO()):
+                import Board
+                shapes = Board.Board().GetChoices()
+
+        oldRuns, newRuns = RunVersions([oldPath, newPath], shapes, args.processes)
+    finally:
+        for path in temporary:
+            shutil.rmtree(path, ignore_errors=True)
+    changes = Compare(oldRuns, newRuns)
+    PrintReport(changes, shapes)
+    return 1 if changes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Exhaustive check of the bounding box automaton on every fixed polyomino up to
+a given number of tiles.
+
+Shapes are streamed from a Redelmeier style generator into a worker pool, each
+one is placed on a right sized board the way SetPolyomino places the families
+and streamed through the board without keeping a log. Anything that does not
+finish with a correct bounding box is written out with its move count.
+
+Throughput on one core: n=8 (3792 shapes) in 21s and n=9 (13702) in 78s. A
+shape costs about 8ms at 9 tiles, 10ms at 10, 15ms at 12 and 19ms at 14, so
+all 691277 shapes up to n=12 take about 3 CPU hours, n=13 (2.6 million) about
+12 and n=14 (9.8 million) about 50. Spread those over --processes cores, or
+start at --minimum to run one size at a time.
+
+Usage:
+    python Enumerate.py 10 --failures failures.jsonl
+"""
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+import Worker
+
+OFFSET = 4 # Same corner SetPolyomino uses for the families
+CHUNK_SIZE = 256 # Shapes handed to a worker at a time
+CHECK_EVERY = 8 # Sample often, small shapes livelock in short cycles
+
+
+def Redelmeier(n):
+    """ Yield every fixed polyomino with 1 to n cells as a tuple of (x, y) cells.
+
+        Cells live in the half plane y > 0 or (y == 0 and x >= 0) so each shape is
+        produced exactly once, with (0, 0) its leftmost cell of the bottom row.
+        Shapes are generated depth first so memory stays O(n).
+    """
+    polyomino = []
+    seen = {(0, 0)} # Cells in the polyomino or next to it, never offered twice
+
+    def Extend(untried):
+        while untried:
+            cell = untried.pop()
+            polyomino.append(cell)
+            yield tuple(polyomino)
+            if len(polyomino) < n:
+                x, y = cell
+                fresh = [c for c in ((x+1, y), (x-1, y), (x, y+1), (x, y-1))
+                         if (c[1] > 0 or (c[1] == 0 and c[0] >= 0)) and c not in seen]
+                seen.update(fresh)
+                yield from Extend(untried + fresh)
+                seen.difference_update(fresh)
+            polyomino.pop()
+
+    yield from Extend([(0, 0)])
+
+
+def Place(cells):
+    """ Shift a shape to the board corner, returns (tile_set, start1, start2, dims) """
+    minX = min(x for x, y in cells)
+    width = max(x for x, y in cells) - minX + 1
+    height = max(y for x, y in cells) + 1
+    tile_set = [(x - minX + OFFSET, y + OFFSET) for x, y in cells]
+    start1 = [OFFSET - minX, OFFSET] # The origin cell, bottom left tile like the families
+    start2 = [OFFSET - minX, OFFSET + 1]
+    return tile_set, start1, start2, Worker.GetBoard().ComputeDims(max(width, height))
+
+
+def _InitWorker(timeLimit=None):
+    import Invariants
+    Worker.Init({"checker": Invariants.InvariantChecker(every=CHECK_EVERY), "timeLimit": timeLimit})
+
+
+def _RunShapes(shapes):
+    """ Run a chunk of shapes, returns (cells, status, message, moves, steps) for each """
+    import Board
+    board = Worker.GetBoard()
+    records = []
+    for cells in shapes:
+        tile_set, start1, start2, dims = Place(cells)
+        board.SetTiles(tile_set, start1, start2, dims, "enumerated", generate=False)
+        for delta in board.Stream(record=False): # Only the final counters are needed, keep no log
+            pass
+        steps = board.log.currentStep # Counted even unrecorded, and past the last delta when a step fails
+        moves = sum(board.results[4])
+        if board.status == Board.STATUS.FINISHED:
+            records.append((None, "finished", "", moves, steps))
+        elif board.checker.livelock is not None:
+            records.append((cells, "livelock", board.statusMessage, moves, steps))
+        else:
+            records.append((cells, board.status.name.lower(), board.statusMessage, moves, steps))
+    return records
+
+
+def Chunks(shapes, size=CHUNK_SIZE):
+    chunk = []
+    for shape in shapes:
+        chunk.append(shape)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def RunAll(n, processes=None, failures=None, minimum=1, timeLimit=None):
+    """ Run every fixed polyomino with minimum to n tiles, returns a Counter of statuses.
+        Failures and livelocks are written to the failures file as JSON lines.
+        A shape running longer than timeLimit seconds is stopped and counted as a timeout. """
+    shapes = (cells for cells in Redelmeier(n) if len(cells) >= minimum)
+    counts = Counter()
+    with Pool(processes, initializer=_InitWorker, initargs=(timeLimit,)) as pool:
+        for records in pool.imap_unordered(_RunShapes, Chunks(shapes)):
+            for cells, status, message, moves, steps in records:
+                counts[status] += 1
+                if cells is not None and failures is not None:
+                    failures.write(json.dumps({"tiles": cells, "status": status, "message": message,
+                                               "moves": moves, "steps": steps}) + "\n")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the automaton on every fixed polyomino up to n tiles.")
+    parser.add_argument("n", type=int)
+    parser.add_argument("--minimum", type=int, default=1, help="Skip shapes with fewer tiles")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--failures", default="failures.jsonl", help="File the failed shapes are written to")
+    parser.add_argument("--time-limit", type=float, default=None, help="Seconds allowed per shape")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    with open(args.failures, "w", encoding="utf-8") as failures:
+        counts = RunAll(args.n, args.processes, failures, args.minimum, args.time_limit)
+    print("Shapes: {} in {:.1f}s".format(sum(counts.values()), time.time() - start))
+    for status, count in sorted(counts.items()):
+        print("{:<12}{}".format(status, count))
+    return 0 if counts.keys() <= {"finished"} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
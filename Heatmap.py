@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Per cell heatmaps of where the robots spend their moves.
+
+Every board counts robot visits, tile placements and tile removals per cell
+while it runs (see Board.GetHeatmap). This runs a batch of polyominoes, sums
+the grids from the board corner up and writes one image per heatmap.
+
+Usage:
+    python Heatmap.py L32 SQ32 C32 --prefix heat
+"""
+import argparse
+import os
+import sys
+from multiprocessing import Pool
+
+import numpy as np
+
+import Board
+import Render
+import Worker
+
+CELL_SIZE = 8 # Pixels per cell in the saved images
+
+def _RunShape(name):
+    """ Run one named polyomino, returns {kind: grid} for every Board.HEATMAPS entry """
+    board = Worker.GetBoard()
+    board.SetPolyomino(name)
+    return {kind: board.GetHeatmap(kind).copy() for kind in Board.HEATMAPS}
+
+
+def Accumulate(grids):
+    """ Sum grids of differing sizes, all aligned on cell (0, 0) """
+    grids = list(grids)
+    width = max(grid.shape[0] for grid in grids)
+    height = max(grid.shape[1] for grid in grids)
+    total = np.zeros((width, height), dtype=np.int64)
+    for grid in grids:
+        total[:grid.shape[0], :grid.shape[1]] += grid
+    return total
+
+
+def RunShapes(names, processes=None):
+    """ Run the shapes in parallel, returns {kind: summed grid} """
+    with Pool(processes, initializer=Worker.Init) as pool:
+        runs = pool.map(_RunShape, names)
+    return {kind: Accumulate(run[kind] for run in runs) for kind in Board.HEATMAPS}
+
+
+def ColorMap(grid):
+    """ White to red on a log scale, returns an (height, width, 3) uint8 image with north up """
+    return Render.HeatColors(grid).transpose(1, 0, 2)[::-1] # Board x,y to image rows, flip the y
+
+
+def SaveImage(grid, path, cellSize=CELL_SIZE):
+    """ Write a heatmap as an image, PNG and friends through PIL when it is there, PPM otherwise """
+    image = ColorMap(grid).repeat(cellSize, axis=0).repeat(cellSize, axis=1)
+    try:
+        from PIL import Image
+    except ImportError:
+        path = os.path.splitext(path)[0] + ".ppm"
+        with open(path, "wb") as f:
+            f.write(Render.PPM(image))
+        return path
+    Image.fromarray(image).save(path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Accumulate per cell heatmaps over a batch of polyominoes.")
+    parser.add_argument("polys", nargs="+")
+    parser.add_argument("--prefix", default="heatmap", help="Images are written to <prefix>-<kind>.png")
+    parser.add_argument("--cell-size", type=int, default=CELL_SIZE)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    heatmaps = RunShapes(args.polys, args.processes)
+    for kind, grid in heatmaps.items():
+        path = SaveImage(grid, "{}-{}.png".format(args.prefix, kind), args.cell_size)
+        hottest = np.unravel_index(grid.argmax(), grid.shape)
+        print("{:<8} total {:>9}  hottest cell {} with {}".format(kind, int(grid.sum()),
+                                                                 tuple(int(i) for i in hottest), int(grid.max())))
+        print("    {}".format(path))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
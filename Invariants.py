@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Sampled invariant checks for the bounding box automaton.
+
+Attach a checker to a board before generating:
+    board.checker = Invariants.InvariantChecker(every=64)
+    board.SetPolyomino("L08")
+    print(board.checker.violations)
+"""
+import numpy as np
+
+import Board
+import MoveLog
+import Precheck
+
+CHECK_EVERY = 64 # Default number of steps between sampled checks
+EXTRA_COMPONENTS = 2 # The bounding box under construction and a tile being shifted may be apart from the polyomino,
+                     # the polyomino's own cells are held to their starting pieces by CheckConnectivity
+BB_GAP = 1 # Empty cells between the polyomino and the finished bounding box
+
+
+class InvariantViolation(Exception):
+    pass
+
+
+def Components(grid):
+    """ 4-connected components of the non zero cells as sets of cells, union-find over those cells only """
+    return Precheck.Components(map(tuple, np.argwhere(grid).tolist()))
+
+
+def LabelComponents(grid):
+    """ 4-connected component labels of the non zero cells, 0 for the background """
+    labels = np.zeros(grid.shape, dtype=int)
+    for label, component in enumerate(Components(grid), 1):
+        labels[tuple(np.array(list(component)).T)] = label
+    return labels
+
+
+def CountComponents(grid):
+    """ Number of 4-connected components of the non zero cells """
+    return len(Components(grid))
+
+
+def OccupiedGrid(tiles, robots):
+    """ Tiles plus the cells under the robots, the robots hold the configuration together """
+    grid = tiles != 0
+    for robot in robots:
+        grid[robot.x, robot.y] = True
+    return grid
+
+
+def CheckRobotBounds(checker, board):
+    """ Robots must stay at least one cell in from the edge so their sensors stay on the board """
+    for number, robot in enumerate([board.robot1, board.robot2], 1):
+        x, y = robot.x, robot.y
+        if not (0 < x < board.width - 1 and 0 < y < board.height - 1):
+            return "robot{} at ({}, {}) left the {}x{} board".format(number, x, y, board.width, board.height)
+
+
+def CheckTileEvents(checker, board):
+    """ Tiles must only be removed from occupied cells and placed on empty ones.
+        Not on by default, the current automaton re-places bounding box tiles routinely. """
+    steps, kinds, cells = board.log.GetEvents()
+    previous = board.log.GetEventPrevious()
+    first = checker.eventsChecked
+    checker.eventsChecked = len(steps)
+    bad = np.nonzero(kinds[first:] == previous[first:])[0] # Placing on a tile or removing from nothing
+    if len(bad):
+        i = first + bad[0]
+        action = "placed on an occupied" if kinds[i] == MoveLog.PLACE else "removed from an empty"
+        return "tile {} cell {} at step {}".format(action, tuple(cells[i].tolist()), steps[i])
+
+
+def CheckConnectivity(checker, board):
+    """ The polyomino's own cells must stay in the pieces they started in, and the whole
+        configuration must not fall apart into more than EXTRA_COMPONENTS more pieces """
+    pieces = CountComponents((board.tiles != 0) & checker.initialTiles)
+    if pieces > checker.initialPieces:
+        return "polyomino split into {} pieces, started with {}".format(pieces, checker.initialPieces)
+    count = CountComponents(OccupiedGrid(board.tiles, [board.robot1, board.robot2]))
+    if count > checker.initialComponents + EXTRA_COMPONENTS:
+        return "configuration split into {} pieces, started with {}".format(count, checker.initialComponents)
+
+
+def CheckLivelock(checker, board):
+    """ The automaton is deterministic so a sampled configuration seen twice will never finish.
+        Brent's method, the saved configuration moves forward at doubling distances. """
+    step = board.log.currentStep - 1
+    key = board.tiles.tobytes() + repr((board.robot1, board.robot2)).encode()
+    if key == checker.savedKey:
+        checker.livelock = (checker.savedStep, step)
+        return "livelock, the configuration repeats every {} steps from step {}".format(
+            step - checker.savedStep, checker.savedStep)
+    if checker.savedKey is None or step - checker.savedStep >= checker.savedDistance:
+        checker.savedKey, checker.savedStep = key, step
+        checker.savedDistance *= 2
+
+
+def CheckBoundingBox(checker, board):
+    """ At the finish the board must hold the untouched polyomino inside a closed rectangle of tiles """
+    initial = checker.initialTiles
+    xs, ys = np.nonzero(initial)
+    x0, x1 = xs.min() - BB_GAP - 1, xs.max() + BB_GAP + 1
+    y0, y1 = ys.min() - BB_GAP - 1, ys.max() + BB_GAP + 1
+    if x0 < 0 or y0 < 0 or x1 >= board.width or y1 >= board.height:
+        return "bounding box ({}, {})-({}, {}) does not fit on the board".format(x0, y0, x1, y1)
+    expected = initial.copy()
+    expected[x0:x1+1, [y0, y1]] = 1
+    expected[[x0, x1], y0:y1+1] = 1
+    wrong = np.argwhere(expected != (board.tiles != 0))
+    if len(wrong):
+        return "final configuration differs from the bounding box in {} cells, first at {}".format(
+            len(wrong), tuple(wrong[0].tolist()))
+
+
+class InvariantChecker:
+
+    def __init__(self, every=CHECK_EVERY, raiseOnViolation=True):
+        """ Run the sampled checks every given number of steps and the final checks at FINISH """
+        self.every = every
+        self.raiseOnViolation = raiseOnViolation
+        self.checks = [CheckRobotBounds, CheckConnectivity, CheckLivelock]
+        self.finalChecks = [CheckBoundingBox]
+        self.violations = []
+        self.lastStep = None
+
+
+    def AddCheck(self, check, final=False):
+        """ Add a check(checker, board) that returns a message when something is wrong """
+        (self.finalChecks if final else self.checks).append(check)
+
+
+    def Reset(self, board):
+        """ Capture the starting configuration of a new run """
+        tile_list, robot1, robot2, message, results = board.log.GetStep(0)
+        self.initialTiles = np.zeros(board.size, dtype=bool)
+        for loc in tile_list:
+            self.initialTiles[loc] = True
+        self.initialPieces = CountComponents(self.initialTiles)
+        self.initialComponents = CountComponents(OccupiedGrid(self.initialTiles, [robot1, robot2]))
+        self.eventsChecked = 0
+        self.violations = []
+        self.savedKey, self.savedStep, self.savedDistance = None, 0, 1 # For CheckLivelock
+        self.livelock = None # (first step, repeated step) once a livelock is found
+
+
+    def Check(self, board):
+        """ Called after each Update, only does work on sampled steps and at FINISH """
+        step = board.log.currentStep - 1
+        if self.lastStep is None or step <= self.lastStep: # The board has started a new run
+            self.Reset(board)
+        self.lastStep = step
+        finished = board.CheckState(board.robot1, Board.STATE.FINISH)
+        if step % self.every and not finished:
+            return
+
+        checks = self.checks + self.finalChecks if finished else self.checks
+        for check in checks:
+            message = check(self, board)
+            if message:
+                message = "Step {}: {}".format(step, message)
+                self.violations.append(message)
+                if self.raiseOnViolation:
+                    raise InvariantViolation(message)
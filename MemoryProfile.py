@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Memory profiling of simulation runs with tracemalloc.
+
+Each shape is generated with tracemalloc on, and every N steps the live
+allocations are split by the code that made them into the subsystems below.
+The report gives the peak for the shape and the bytes each subsystem grows
+by per step. Saved as a baseline, a later run flags any shape whose peak or
+bytes per step grew past the tolerance.
+    log      MoveLog's per step snapshots, the tile lists, events and phases
+    board    the tile grid and heatmaps
+    robots   Robot objects, mostly the copies every logged step keeps
+    counters MoveLog's per step and per event column arrays
+
+Usage:
+    python MemoryProfile.py --save memory.json
+    python MemoryProfile.py --check memory.json --every 500 L08 C16
+"""
+import argparse
+import ast
+import json
+import os
+import sys
+import tracemalloc
+from bisect import bisect_right
+
+SHAPES = ["L08", "L16", "C16", "SQ16", "U16", "TUBS", "Temple"]
+EVERY = 5000 # Steps between samples, each one costs about a second per million live allocations
+SUBSYSTEMS = [ # (file, function prefix, subsystem), the first match wins
+    ("Board.py", "Robot.", "robots"),
+    ("MoveLog.py", "MoveLog.Reset", "counters"),
+    ("MoveLog.py", "MoveLog._Grow", "counters"),
+    ("MoveLog.py", "", "log"),
+    ("Board.py", "", "board"),
+]
+NAMES = ["log", "board", "robots", "counters", "other"]
+TOLERANCE = 0.2 # Relative growth allowed in a peak or in bytes per step
+SLACK = 64 # Bytes per step, and kilobytes of peak, always allowed
+
+_functions = {} # File name to (starts, [(start, end, qualified name)]) of its functions
+
+
+def Functions(filename):
+    """ Line ranges of the functions in a source file, innermost last among those sharing a line """
+    if filename not in _functions:
+        ranges = []
+        try:
+            with open(filename, encoding="utf-8") as f:
+                tree = ast.parse(f.read())
+        except (OSError, SyntaxError, ValueError):
+            tree = ast.Module(body=[], type_ignores=[])
+
+        def Visit(node, prefix):
+            for child in ast.iter_child_nodes(node):
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    name = prefix + child.name
+                    if not isinstance(child, ast.ClassDef):
+                        ranges.append((child.lineno, child.end_lineno, name))
+                    Visit(child, name + ".")
+        Visit(tree, "")
+        ranges.sort()
+        _functions[filename] = ([start for start, end, name in ranges], ranges)
+    return _functions[filename]
+
+
+def Subsystem(filename, lineno):
+    """ The subsystem of an allocation made at a line of a file """
+    base = os.path.basename(filename)
+    rules = [(prefix, subsystem) for file, prefix, subsystem in SUBSYSTEMS if file == base]
+    if not rules:
+        return "other"
+    starts, ranges = Functions(filename)
+    function = ""
+    for start, end, name in reversed(ranges[:bisect_right(starts, lineno)]): # Innermost function holding the line
+        if lineno <= end:
+            function = name
+            break
+    return next(subsystem for prefix, subsystem in rules if function.startswith(prefix))
+
+
+def Attribute(snapshot):
+    """ Bytes held per subsystem in a tracemalloc snapshot """
+    totals = dict.fromkeys(NAMES, 0)
+    for stat in snapshot.statistics("lineno"): # Cheaper than filter_traces, which copies every trace
+        frame = stat.traceback[0]
+        if frame.filename not in (tracemalloc.__file__, __file__): # The profiler's own samples
+            totals[Subsystem(frame.filename, frame.lineno)] += stat.size
+    return totals
+
+
+def ProfileShape(board, name, every=EVERY):
+    """ Generate one shape under tracemalloc, returns its steps, peak, samples of
+        (step, totals) and the bytes per step of every subsystem """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.clear_traces() # Count this shape alone
+        board.SetPolyomino(name, generate=False)
+        peak = 0
+        samples = []
+
+        def Sample(step):
+            nonlocal peak
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            samples.append((step, Attribute(tracemalloc.take_snapshot())))
+            tracemalloc.reset_peak() # The snapshot just taken is not the run's
+
+        Sample(0)
+        step = 0
+        for delta in board.Stream():
+            step = delta["step"]
+            if step % every == 0:
+                Sample(step)
+        if samples[-1][0] != step:
+            Sample(step)
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    first, last = samples[0][1], samples[-1][1]
+    perStep = {subsystem: (last[subsystem] - first[subsystem]) / max(1, step) for subsystem in NAMES}
+    return {"steps": step, "status": board.status.name, "peak": peak, "final": last,
+            "perStep": perStep, "samples": samples}
+
+
+def ProfileShapes(names, every=EVERY, board=None):
+    """ Profile the named shapes in turn, returns {name: ProfileShape result} """
+    if board is None:
+        import Board
+        board = Board.Board()
+    board.verbose = False
+    return {name: ProfileShape(board, name, every) for name in names}
+
+
+def Summary(profiles):
+    """ The peak and bytes per step of every shape, what a baseline keeps """
+    return {name: {"peak": profile["peak"], "perStep": profile["perStep"]} for name, profile in profiles.items()}
+
+
+def FindRegressions(summary, baseline, tolerance=TOLERANCE):
+    """ Compare against a baseline, returns a list of readable messages for anything that grew """
+    regressions = []
+    for name, old in baseline.items():
+        new = summary.get(name)
+        if new is None:
+            continue
+        if new["peak"] > old["peak"]*(1 + tolerance) + SLACK*1024:
+            regressions.append("{} peak: {:.1f}KB -> {:.1f}KB".format(name, old["peak"]/1024, new["peak"]/1024))
+        for subsystem, bytes in old["perStep"].items():
+            grown = new["perStep"].get(subsystem, 0)
+            if grown > bytes*(1 + tolerance) + SLACK:
+                regressions.append("{} {}: {:.0f} -> {:.0f} bytes/step".format(name, subsystem, bytes, grown))
+    return regressions
+
+
+def PrintReport(profiles):
+    print("{:<10}{:>8}{:>12}".format("Shape", "Steps", "Peak KB") + "".join("{:>10}".format(n) for n in NAMES))
+    print("="*(30 + 10*len(NAMES)))
+    for name, profile in profiles.items():
+        print("{:<10}{:>8}{:>12.1f}".format(name, profile["steps"], profile["peak"]/1024) +
+              "".join("{:>10.0f}".format(profile["perStep"][n]) for n in NAMES))
+    print("Subsystem columns are bytes per step")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the memory of simulation runs with tracemalloc.")
+    parser.add_argument("shapes", nargs="*", default=SHAPES, help="SetPolyomino presets to profile")
+    parser.add_argument("--every", type=int, default=EVERY, help="Steps between samples")
+    parser.add_argument("--save", help="Write the peaks and bytes per step to this baseline file")
+    parser.add_argument("--check", help="Compare the peaks and bytes per step against this baseline file")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    profiles = ProfileShapes(args.shapes, args.every)
+    PrintReport(profiles)
+    summary = Summary(profiles)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    if args.check:
+        with open(args.check, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = FindRegressions(summary, baseline, args.tolerance)
+        for message in regressions:
+            print("REGRESSION", message)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
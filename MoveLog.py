@@ -6,35 +6,331 @@ Dan Biediger
 2019
 University of Houston
 """
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+REMOVE = 0 # Event kinds
+PLACE = 1
+STEP_COLUMNS = ["counters", "robotPositions", "robotHeadings", "robotStates"]
+EVENT_COLUMNS = ["eventSteps", "eventKinds", "eventCells", "eventPrevious"]
+COUNTER_COLUMNS = ["step", "moves", "placed", "picked",
+                   "Initial Search", "Add/Shift Tile", "Delete Tile", "Move/Search"]
+CATEGORIES = COUNTER_COLUMNS[4:]
+OTHER = -1 # Category of a step that counted in none of CATEGORIES
+PHASE_TRACKS = ["robot1", "robot2", "category"] # STATE values of each robot, CATEGORIES index
+
+class PhaseIndex:
+
+    def __init__(self):
+        """ Run-length index of one value per step, every run of equal values is an episode """
+        self.starts = [] # First step of every run
+        self.values = [] # Value of every run
+        self.episodes = {} # Value to its run numbers in order
+        self.episodeStarts = {} # Value to the first steps of its runs, for bisecting
+        self.totals = {} # Value to the number of steps with it
+        self.longest = {} # Value to its longest finished run
+        self.steps = 0
+
+
+    def Add(self, step, value):
+        """ Append the value of the next step """
+        if not self.values or self.values[-1] != value:
+            if self.values:
+                self._Close()
+            self.episodes.setdefault(value, []).append(len(self.starts))
+            self.episodeStarts.setdefault(value, []).append(step)
+            self.starts.append(step)
+            self.values.append(value)
+        self.totals[value] = self.totals.get(value, 0) + 1
+        self.steps = step + 1
+
+
+    def _Close(self):
+        run = len(self.starts) - 1
+        value = self.values[run]
+        best = self.longest.get(value)
+        if best is None or self.RunLength(run) > self.RunLength(best):
+            self.longest[value] = run
+
+
+    def RunLength(self, run):
+        end = self.starts[run + 1] if run + 1 < len(self.starts) else self.steps
+        return end - self.starts[run]
+
+
+    def Run(self, run):
+        """ (value, first step, step after the last) of a run """
+        return self.values[run], self.starts[run], self.starts[run] + self.RunLength(run)
+
+
+    def At(self, step):
+        """ The run holding a step """
+        return bisect_right(self.starts, step) - 1
+
+
+    def EpisodeNumber(self, run):
+        """ Which episode of its value a run is, counting from 0 """
+        return bisect_left(self.episodeStarts[self.values[run]], self.starts[run])
+
+
+    def Count(self, value):
+        return len(self.episodes.get(value, []))
+
+
+    def Episode(self, value, k):
+        """ (first step, step after the last) of the k-th episode of a value, counting from 0 """
+        run = self.episodes[value][k]
+        return self.starts[run], self.starts[run] + self.RunLength(run)
+
+
+    def NextEpisode(self, value, step):
+        """ Number of the first episode of a value starting after step, None when there is none """
+        k = bisect_right(self.episodeStarts.get(value, []), step)
+        return k if k < self.Count(value) else None
+
+
+    def PreviousEpisode(self, value, step):
+        """ Number of the last episode of a value starting before step, None when there is none """
+        k = bisect_left(self.episodeStarts.get(value, []), step) - 1
+        return k if k >= 0 else None
+
+
+    def Longest(self, value):
+        """ (first step, step after the last) of the longest episode of a value, the earliest on a tie """
+        runs = [run for run in (self.longest.get(value), len(self.starts) - 1)
+                if run is not None and run >= 0 and self.values[run] == value]
+        if not runs:
+            return None
+        run = max(runs, key=lambda run: (self.RunLength(run), -run))
+        return self.starts[run], self.starts[run] + self.RunLength(run)
+
+
+    def Share(self):
+        """ Value to the fraction of the steps spent on it """
+        return {value: count / self.steps for value, count in self.totals.items()}
+
+
+    @classmethod
+    def FromValues(cls, values):
+        """ Build the index of a whole run of values at once """
+        index = cls()
+        values = np.asarray(values)
+        if not len(values):
+            return index
+        starts = np.flatnonzero(np.diff(values)) + 1
+        starts = np.concatenate(([0], starts)).tolist()
+        lengths = np.diff(starts + [len(values)]).tolist()
+        for run, (start, length) in enumerate(zip(starts, lengths)):
+            value = values[start].item()
+            index.starts.append(start)
+            index.values.append(value)
+            index.episodes.setdefault(value, []).append(run)
+            index.episodeStarts.setdefault(value, []).append(start)
+            index.totals[value] = index.totals.get(value, 0) + length
+            best = index.longest.get(value)
+            if run < len(starts) - 1 and (best is None or length > lengths[best]):
+                index.longest[value] = run
+        index.steps = len(values)
+        return index
+
+
+def StepCategories(categories):
+    """ The CATEGORIES index counted on each step of a (steps, 4) array of running totals, OTHER for none """
+    counted = np.diff(categories, axis=0, prepend=np.zeros((1, categories.shape[1]), categories.dtype)) > 0
+    return np.where(counted.any(axis=1), counted.argmax(axis=1), OTHER)
 
 class MoveLog:
-    
+
     def __init__(self):
         """ Create an empy maze of dimension given by dims """
+        self.record = True # When False only the step count and the current step's events are kept
+        self.window = None # Cells (u0, v0, u1, v1) whose tiles are logged, the whole board when None
         self.Reset()
 
 
     def Reset(self):
         self.currentStep = 0
         self.log = {}
+        self.stepEvents = [] # (kind, loc) of the most recent step that had any
+        self.stepEventsStep = -1
+        # Per step columns, grown by doubling so appends are amortized O(1)
+        self.capacity = INITIAL_CAPACITY
+        self.counters = np.zeros((self.capacity, len(COUNTER_COLUMNS)), dtype=np.int64)
+        self.robotPositions = np.zeros((self.capacity, 2, 2), dtype=np.int32) # [step, robot, (x,y)]
+        self.robotHeadings = np.zeros((self.capacity, 2), dtype=np.int8) # NORTH/EAST/SOUTH/WEST bits
+        self.robotStates = np.zeros((self.capacity, 2), dtype=np.int16) # STATE values
+        # Tile place/remove events tagged with the step that caused them
+        self.eventCount = 0
+        self.eventCapacity = INITIAL_CAPACITY
+        self.eventSteps = np.zeros(self.eventCapacity, dtype=np.int32)
+        self.eventKinds = np.zeros(self.eventCapacity, dtype=np.int8) # PLACE or REMOVE
+        self.eventCells = np.zeros((self.eventCapacity, 2), dtype=np.int32)
+        self.eventPrevious = np.zeros(self.eventCapacity, dtype=np.int8) # Tile value before the event
+        # Phase episodes of the recorded steps, see PHASE_TRACKS
+        self.phases = {track: PhaseIndex() for track in PHASE_TRACKS}
+        self.lastCategories = [0]*len(CATEGORIES)
+
+
+    def _Grow(self, names, capacity):
+        """ Enlarge the named columns to the given capacity. """
+        for name in names:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
 
 
     def LogState(self, tiles, robot1, robot2, message, results):
-        tile_list = []
-        width, height = tiles.shape
-        # Log in all the tiles
-        for v in range(height):
-            for u in range(width):
-                if tiles[u,v] == 1:
-                    tile_list.append((u,v))
-        
-        self.log[self.currentStep] = (tile_list, list(robot1), list(robot2), message, results)
+        if not self.record:
+            self.currentStep += 1
+            return
+
+        # Log in all the tiles, row by row from the bottom
+        if self.window is None:
+            vs, us = np.nonzero(tiles.T == 1)
+        else:
+            u0, v0, u1, v1 = self.window
+            vs, us = np.nonzero(tiles[u0:u1, v0:v1].T == 1)
+            us += u0
+            vs += v0
+        tile_list = list(zip(us.tolist(), vs.tolist()))
+
+        # Copy the nested category counters so every step keeps its own values
+        results = list(results[:4]) + [list(results[4])]
+        self.log[self.currentStep] = (tile_list, robot1.Copy(), robot2.Copy(), message, results)
+
+        if self.currentStep == self.capacity:
+            self.capacity *= 2
+            self._Grow(STEP_COLUMNS, self.capacity)
+        step = self.currentStep
+        self.counters[step, 0] = step
+        self.counters[step, 1:4] = results[1:4]
+        self.counters[step, 4:] = results[4]
+        self.robotPositions[step] = ((robot1.x, robot1.y), (robot2.x, robot2.y))
+        self.robotHeadings[step] = (robot1.heading, robot2.heading)
+        self.robotStates[step] = (robot1.state.value, robot2.state.value)
+        categories = results[4]
+        category = next((i for i, (new, old) in enumerate(zip(categories, self.lastCategories)) if new != old), OTHER)
+        self.lastCategories = categories
+        self.phases["robot1"].Add(step, robot1.state.value)
+        self.phases["robot2"].Add(step, robot2.state.value)
+        self.phases["category"].Add(step, category)
         self.currentStep += 1
-    
-    
+
+
+    def LogEvent(self, kind, loc, previous):
+        """ Record a tile being placed or removed during the current step """
+        if self.stepEventsStep != self.currentStep:
+            self.stepEvents = []
+            self.stepEventsStep = self.currentStep
+        self.stepEvents.append((kind, loc))
+        if not self.record:
+            return
+
+        if self.eventCount == self.eventCapacity:
+            self.eventCapacity *= 2
+            self._Grow(EVENT_COLUMNS, self.eventCapacity)
+        self.eventSteps[self.eventCount] = self.currentStep
+        self.eventKinds[self.eventCount] = kind
+        self.eventCells[self.eventCount] = loc
+        self.eventPrevious[self.eventCount] = previous
+        self.eventCount += 1
+
+
     def GetStep(self, step):
         if step in self.log:
             return self.log[step]
-    
+
+    def GetStepEvents(self, step):
+        """ The (kind, loc) events of the given step, only kept for the latest step """
+        return self.stepEvents if self.stepEventsStep == step else []
+
     def GetStepCount(self):
         return len(self.log)
+
+    def GetColumn(self, name):
+        """ The whole run of one counter column, see COUNTER_COLUMNS for the names """
+        return self.counters[:self.currentStep, COUNTER_COLUMNS.index(name)]
+
+    def GetCounters(self):
+        """ The whole run of counters as a (steps, len(COUNTER_COLUMNS)) array """
+        return self.counters[:self.currentStep]
+
+    def GetRobotPositions(self):
+        """ The whole run of robot positions as a (steps, 2, 2) array """
+        return self.robotPositions[:self.currentStep]
+
+    def GetRobotHeadings(self):
+        """ The whole run of robot headings as a (steps, 2) array """
+        return self.robotHeadings[:self.currentStep]
+
+    def GetRobotStates(self):
+        """ The whole run of robot STATE values as a (steps, 2) array """
+        return self.robotStates[:self.currentStep]
+
+    def GetEvents(self):
+        """ All tile events as (steps, kinds, cells) arrays in the order they happened """
+        n = self.eventCount
+        return self.eventSteps[:n], self.eventKinds[:n], self.eventCells[:n]
+
+    def GetEventPrevious(self):
+        """ The tile value each event overwrote, in the same order as GetEvents """
+        return self.eventPrevious[:self.eventCount]
+
+    def GetDelta(self, a, b):
+        """ The changes between recorded steps a and b, either way round, in O(changes between them).
+            A dict of the two steps, the net tile changes as (loc, before, after), each robot's
+            (x, y, heading, state value) as (before, after) and the counters at both steps.
+            Board.ApplyDelta applies it forwards, or backwards to undo it. """
+        steps = len(self.log)
+        if not (0 <= a < steps and 0 <= b < steps):
+            raise IndexError("steps {} and {} are not both among the {} recorded".format(a, b, steps))
+        lo, hi = min(a, b), max(a, b)
+        first, end = np.searchsorted(self.eventSteps[:self.eventCount], [lo + 1, hi + 1]) # Events of steps lo+1 to hi
+        changes = {} # Cell to [value at a, value at b]
+        for i in (range(first, end) if a <= b else range(end - 1, first - 1, -1)):
+            loc = (int(self.eventCells[i, 0]), int(self.eventCells[i, 1]))
+            old, new = int(self.eventPrevious[i]), int(self.eventKinds[i] == PLACE)
+            before, after = (old, new) if a <= b else (new, old)
+            if loc in changes:
+                changes[loc][1] = after
+            else:
+                changes[loc] = [before, after]
+        tiles = [(loc, before, after) for loc, (before, after) in changes.items() if before != after]
+        ends = [(self.robotPositions[step].tolist(), self.robotHeadings[step].tolist(), self.robotStates[step].tolist())
+                for step in (a, b)]
+        robots = [tuple((*positions[n], headings[n], states[n]) for positions, headings, states in ends)
+                  for n in range(2)]
+        return {"from": a, "step": b, "tiles": tiles, "robots": robots,
+                "counters": (self.counters[a].tolist(), self.counters[b].tolist())}
+
+    def GetColumns(self):
+        """ All the per step and per event columns by name, trimmed to what has been logged """
+        steps = len(self.log)
+        columns = {name: getattr(self, name)[:steps] for name in STEP_COLUMNS}
+        columns.update({name: getattr(self, name)[:self.eventCount] for name in EVENT_COLUMNS})
+        return columns
+
+    def SetColumns(self, columns):
+        """ Replace the per step and per event columns with ones from GetColumns """
+        steps, events = len(columns[STEP_COLUMNS[0]]), len(columns[EVENT_COLUMNS[0]])
+        self.capacity = max(INITIAL_CAPACITY, 1 << (steps - 1).bit_length())
+        self.eventCapacity = max(INITIAL_CAPACITY, 1 << (events - 1).bit_length())
+        for name in STEP_COLUMNS + EVENT_COLUMNS:
+            setattr(self, name, np.array(columns[name][:0], dtype=columns[name].dtype))
+        self._Grow(STEP_COLUMNS, self.capacity)
+        self._Grow(EVENT_COLUMNS, self.eventCapacity)
+        for name in STEP_COLUMNS + EVENT_COLUMNS:
+            getattr(self, name)[:len(columns[name])] = columns[name]
+        self.eventCount = events
+        self.phases = {"robot1": PhaseIndex.FromValues(columns["robotStates"][:, 0]),
+                       "robot2": PhaseIndex.FromValues(columns["robotStates"][:, 1]),
+                       "category": PhaseIndex.FromValues(StepCategories(columns["counters"][:, 4:]))}
+        if steps:
+            self.lastCategories = columns["counters"][-1, 4:].tolist()
+
+    def GetPhases(self, track):
+        """ The PhaseIndex of one of PHASE_TRACKS over the recorded steps """
+        return self.phases[track]
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Many polyominoes on one large board, each built by its own team of robots.
+
+The shapes are laid out in rows on a single tile grid, every one in a region
+of its own with REGION_MARGIN empty cells round its bounding box. A team is
+one shape's robot pair with its own results, log, budget and status. Each
+global tick advances every running team by one Board.Update, and teams stop
+on their own as they finish or run out of steps.
+
+Robots of a run stay within 3 cells of their shape's bounding box. A team
+whose robot comes within ROBOT_INSET cells of its region edge is stopped with
+STATUS.ERROR before anything it senses or places can reach a neighbour.
+    multi = MultiBoard.MultiBoard(MultiBoard.FromPresets(["L08", "SQ16", "C08"]))
+    multi.Run()
+    for team in multi.teams:
+        print(team.name, team.status, team.results)
+
+Usage:
+    python MultiBoard.py L08 SQ16 C08
+    python MultiBoard.py --enumerate 6 --no-record
+"""
+import argparse
+import math
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+import Board
+import MoveLog
+import Precheck
+
+REGION_MARGIN = 5 # Empty cells between a shape's bounding box and the edge of its region
+ROBOT_INSET = 2 # Cells a robot keeps from its region edge, a step and a look stay inside
+
+
+class Team:
+
+    def __init__(self, name, tile_set, start1, start2, region):
+        """ One shape's robot pair, results and log, kept to the cells region = (u0, v0, u1, v1) """
+        self.name = name
+        self.tile_set = tile_set
+        self.region = region
+        self.robot1 = Board.Robot(start1, Board.STATE.SEARCHSOUTH, Board.SOUTH)
+        self.robot2 = Board.Robot(start2, Board.STATE.IDLE, Board.SOUTH)
+        self.results = [0,0,0,0,[0,0,0,0]]
+        self.log = MoveLog.MoveLog()
+        self.log.window = region # Only this team's tiles go in its log
+        self.budget = 0
+        self.status = Board.STATUS.RUNNING
+        self.statusMessage = ""
+
+
+    def Inside(self, robot):
+        """ The robot is at least ROBOT_INSET cells in from the region edge """
+        u0, v0, u1, v1 = self.region
+        return (u0 + ROBOT_INSET <= robot.x < u1 - ROBOT_INSET and
+                v0 + ROBOT_INSET <= robot.y < v1 - ROBOT_INSET)
+
+
+    def GetSteps(self):
+        """ Updates run so far, the log's step count less the initial state """
+        return self.log.currentStep - 1
+
+
+    def Stop(self, status, message=""):
+        self.status = status
+        self.statusMessage = message
+
+
+class MultiBoard:
+
+    def __init__(self, shapes, columns=None, record=True, board=None):
+        """ shapes is a list of (name, tile_set, start1, start2) in any coordinates, laid out
+            columns to a row, a square when None. With record False the teams' logs keep
+            only their step counts. """
+        self.board = board if board is not None else Board.Board()
+        self.board.verbose = False
+        self.board.precheck = False # Every team is checked on its own region
+        self.board.checker = None # Invariants follow a single robot pair
+        self.record = record
+        self.tick = 0
+        self.Layout(shapes, columns)
+
+
+    def Layout(self, shapes, columns=None):
+        """ Give every shape a region, set the shared board and start the teams """
+        columns = columns or max(1, math.ceil(math.sqrt(len(shapes))))
+        placed = []
+        x = y = width = rowHeight = 0
+        for i, (name, tile_set, start1, start2) in enumerate(shapes):
+            if i and i % columns == 0: # Next row
+                x = 0
+                y += rowHeight
+                rowHeight = 0
+            cells = list(tile_set) or [tuple(start1)]
+            minX = min(loc[0] for loc in cells)
+            minY = min(loc[1] for loc in cells)
+            w = max(loc[0] for loc in cells) - minX + 1 + 2*REGION_MARGIN
+            h = max(loc[1] for loc in cells) - minY + 1 + 2*REGION_MARGIN
+            dx, dy = x + REGION_MARGIN - minX, y + REGION_MARGIN - minY
+            placed.append((name, [(loc[0] + dx, loc[1] + dy) for loc in tile_set],
+                           [start1[0] + dx, start1[1] + dy], [start2[0] + dx, start2[1] + dy],
+                           (x, y, x + w, y + h)))
+            x += w
+            width = max(width, x)
+            rowHeight = max(rowHeight, h)
+        dims = (max(1, width), max(1, y + rowHeight))
+
+        everything = [loc for shape in placed for loc in shape[1]]
+        first = placed[0] if placed else (None, [], [0, 0], [0, 1], None)
+        self.board.log = MoveLog.MoveLog() # Not a team's log left from an earlier layout
+        self.board.SetTiles(everything, first[2], first[3], dims, "multi", generate=False)
+        self.teams = [Team(*shape) for shape in placed]
+        reason = self.CheckSpacing()
+        if reason is not None:
+            raise ValueError(reason)
+
+        for team in self.teams:
+            u0, v0, u1, v1 = team.region
+            team.budget = self.board.ComputeBudget(team.tile_set)
+            rejection = Precheck.CheckPlacement([(tx - u0, ty - v0) for tx, ty in team.tile_set],
+                                                [team.robot1.x - u0, team.robot1.y - v0],
+                                                [team.robot2.x - u0, team.robot2.y - v0], (u1 - u0, v1 - v0))
+            if rejection is not None:
+                team.Stop(Board.STATUS.REJECTED, rejection)
+            self.Select(team)
+            self.board.LogResults("Initial Board State")
+            team.log.record = self.record
+
+
+    def CheckSpacing(self):
+        """ The reason two teams could interfere, None when every region is its own and
+            every shape sits REGION_MARGIN cells inside its region """
+        owner = np.full(self.board.size, -1, dtype=np.int32)
+        for i, team in enumerate(self.teams):
+            u0, v0, u1, v1 = team.region
+            taken = owner[u0:u1, v0:v1]
+            if (taken >= 0).any():
+                other = self.teams[taken.max()]
+                return "the regions of {} and {} overlap".format(team.name, other.name)
+            taken[...] = i
+            for tx, ty in team.tile_set:
+                margin = min(tx - u0, ty - v0, u1 - 1 - tx, v1 - 1 - ty)
+                if margin < REGION_MARGIN:
+                    return "tile ({}, {}) of {} is {} cells from the edge of its region, {} are needed".format(
+                        tx, ty, team.name, margin, REGION_MARGIN)
+        return None
+
+
+    def Select(self, team):
+        """ Put a team's robots, results and log on the board, Update and Draw then work on it """
+        self.board.robot1 = team.robot1
+        self.board.robot2 = team.robot2
+        self.board.results = team.results
+        self.board.log = team.log
+        self.board.shownStep = None # The board now shows this team's run as it is, not a logged step
+
+
+    def Tick(self):
+        """ Advance every running team by one step, returns the number still running """
+        running = 0
+        for team in self.teams:
+            if team.status != Board.STATUS.RUNNING:
+                continue
+            self.Select(team)
+            try:
+                self.board.Update()
+            except Exception as e:
+                team.Stop(Board.STATUS.ERROR, str(e))
+                continue
+            if team.robot1.state == Board.STATE.FINISH:
+                team.Stop(Board.STATUS.FINISHED)
+            elif not (team.Inside(team.robot1) and team.Inside(team.robot2)):
+                robot = "robot1" if not team.Inside(team.robot1) else "robot2"
+                team.Stop(Board.STATUS.ERROR, "{} at {} came within {} cells of the edge of its region".format(
+                    robot, getattr(team, robot).position, ROBOT_INSET))
+            elif team.GetSteps() >= team.budget:
+                team.Stop(Board.STATUS.EXHAUSTED, "used up the budget of {} steps".format(team.budget))
+            else:
+                running += 1
+        self.tick += 1
+        return running
+
+
+    def Run(self, timeLimit=None):
+        """ Tick until every team has stopped, returns a Counter of their statuses.
+            Teams still running after timeLimit seconds end with STATUS.TIMEOUT. """
+        deadline = None if timeLimit is None else time.monotonic() + timeLimit
+        while self.Tick():
+            if deadline is not None and self.tick % Board.WATCHDOG_STEPS == 0 and time.monotonic() > deadline:
+                for team in self.teams:
+                    if team.status == Board.STATUS.RUNNING:
+                        team.Stop(Board.STATUS.TIMEOUT, "stopped after {} steps, over the {}s time limit".format(
+                            team.GetSteps(), timeLimit))
+                break
+        return Counter(team.status for team in self.teams)
+
+
+def FromPresets(names, board=None):
+    """ Shapes of the SetPolyomino presets for MultiBoard """
+    board = board if board is not None else Board.Board()
+    verbose, board.verbose = board.verbose, False
+    shapes = []
+    for name in names:
+        board.SetPolyomino(name, generate=False)
+        us, vs = np.nonzero(board.tiles == 1)
+        shapes.append((name, list(zip(us.tolist(), vs.tolist())),
+                       list(board.robot1.position), list(board.robot2.position)))
+    board.verbose = verbose
+    return shapes
+
+
+def FromCells(polyominoes):
+    """ Shapes from Enumerate.Redelmeier style cell tuples, robot 1 starting on the origin cell """
+    return [("".join(str(cell) for cell in cells), list(cells), [0, 0], [0, 1]) for cells in polyominoes]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run many polyominoes side by side on one board.")
+    parser.add_argument("names", nargs="*", help="SetPolyomino presets to run")
+    parser.add_argument("--enumerate", type=int, default=None, help="Add every fixed polyomino up to this many tiles")
+    parser.add_argument("--columns", type=int, default=None, help="Regions in a row, a square by default")
+    parser.add_argument("--no-record", action="store_true", help="Keep only step counts in the team logs")
+    parser.add_argument("--time-limit", type=float, default=None, help="Seconds allowed for the whole board")
+    args = parser.parse_args(argv)
+
+    shapes = FromPresets(args.names) if args.names else []
+    if args.enumerate:
+        import Enumerate
+        shapes += FromCells(Enumerate.Redelmeier(args.enumerate))
+    if not shapes:
+        parser.error("give preset names or --enumerate")
+
+    start = time.time()
+    multi = MultiBoard(shapes, args.columns, not args.no_record)
+    counts = multi.Run(args.time_limit)
+    print("Teams: {} on a {}x{} board, {} ticks in {:.1f}s".format(
+        len(multi.teams), multi.board.width, multi.board.height, multi.tick, time.time() - start))
+    for team in multi.teams:
+        if team.status != Board.STATUS.FINISHED or len(multi.teams) <= 20:
+            print("{:<24}{:<10}{:>8} moves {}".format(team.name[:23], team.status.name, team.results[1],
+                                                     team.statusMessage))
+    for status, count in sorted((status.name, count) for status, count in counts.items()):
+        print("{:<12}{}".format(status, count))
+    return 0 if set(counts) <= {Board.STATUS.FINISHED} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
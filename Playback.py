@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Non-blocking playback of a generated run on the Tk event loop.
+
+Frames are scheduled with after() at stepsPerSecond/stepsPerFrame frames a
+second. Each frame moves on by the time that actually passed, so when
+drawing falls behind the player skips steps rather than slowing down.
+    player = Playback.Player(root, ShowStep, board.GetMoveCount)
+    player.Play()
+"""
+import time
+
+STEPS_PER_SECOND = 15 # The old Iterate speed
+STEPS_PER_FRAME = 1
+
+
+class Player:
+
+    def __init__(self, widget, show, count):
+        """ widget schedules the frames, show(step) draws a step and count() is the number of steps """
+        self.widget = widget
+        self.show = show
+        self.count = count
+        self.stepsPerSecond = STEPS_PER_SECOND
+        self.stepsPerFrame = STEPS_PER_FRAME
+        self.step = 0 # The step on screen
+        self.position = 0.0 # Where playback has got to, ahead of step while a frame is drawn
+        self.job = None # The pending after() callback while playing
+        self.skipped = 0 # Frames left out because drawing fell behind
+
+
+    def IsPlaying(self):
+        return self.job is not None
+
+
+    def Play(self):
+        if self.IsPlaying():
+            return
+        if self.step >= self.count() - 1: # Start again from the top
+            self.Seek(0)
+        self.position = self.step
+        self.last = time.monotonic()
+        self.job = self.widget.after(0, self._Tick)
+
+
+    def Pause(self):
+        if self.job is not None:
+            self.widget.after_cancel(self.job)
+            self.job = None
+
+
+    def Toggle(self):
+        if self.IsPlaying():
+            self.Pause()
+        else:
+            self.Play()
+
+
+    def Seek(self, step):
+        """ Show a step, nothing is redrawn when it is already on screen """
+        step = max(0, min(int(step), self.count() - 1))
+        if step != self.step:
+            self.step = step
+            self.position = step
+            self.show(step)
+
+
+    def _Tick(self):
+        now = time.monotonic()
+        self.position += (now - self.last) * self.stepsPerSecond
+        self.last = now
+        last = self.count() - 1
+        step = min(int(self.position), last)
+        if step - self.step > self.stepsPerFrame: # Drawing is behind, the frames between are dropped
+            self.skipped += (step - self.step) // self.stepsPerFrame - 1
+        if step != self.step:
+            self.step = step
+            self.show(step)
+        if step >= last:
+            self.job = None
+            return
+        interval = self.stepsPerFrame / self.stepsPerSecond
+        spent = time.monotonic() - now # Time taken drawing comes off the wait for the next frame
+        self.job = self.widget.after(max(1, int(1000*(interval - spent))), self._Tick)
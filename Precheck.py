@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Fast validation of a tile set and robot starts before any moves are spent on it.
+
+Board.SetTiles runs CheckPlacement first and a board that fails ends with
+STATUS.REJECTED and the reason in statusMessage instead of generating.
+    reason = Precheck.CheckPlacement(tile_set, start1, start2, dims)
+"""
+import numpy as np
+
+MIN_MARGIN = 3 # Empty cells between the polyomino and the board edge: the gap, the bounding box row and a
+               # cell for the robot's sensors, which Invariants.CheckRobotBounds keeps off the edge row
+NEIGHBOURS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+def Find(parent, cell):
+    """ Root of a cell in the union-find forest, halving the path on the way up """
+    while parent[cell] != cell:
+        parent[cell] = parent[parent[cell]]
+        cell = parent[cell]
+    return cell
+
+
+def Components(cells):
+    """ 4-connected components of a set of cells by union-find, returns a list of sets """
+    parent = {cell: cell for cell in cells}
+    for x, y in parent:
+        for neighbour in ((x+1, y), (x, y+1)):
+            if neighbour in parent:
+                a, b = Find(parent, (x, y)), Find(parent, neighbour)
+                if a != b:
+                    parent[a] = b
+    components = {}
+    for cell in parent:
+        components.setdefault(Find(parent, cell), set()).add(cell)
+    return list(components.values())
+
+
+def Exterior(blocked):
+    """ Cells reachable from the board edge without crossing a blocked cell """
+    reach = np.zeros(blocked.shape, dtype=bool)
+    reach[[0, -1], :] = True
+    reach[:, [0, -1]] = True
+    reach &= ~blocked
+    while True:
+        grown = reach.copy()
+        grown[1:] |= reach[:-1]
+        grown[:-1] |= reach[1:]
+        grown[:, 1:] |= reach[:, :-1]
+        grown[:, :-1] |= reach[:, 1:]
+        grown &= ~blocked
+        if np.array_equal(grown, reach):
+            return reach
+        reach = grown
+
+
+def CheckPlacement(tile_set, start1, start2, dims):
+    """ The reason a configuration cannot be run, None when it is fine.
+        The tiles must be one piece clear of the board edge by MIN_MARGIN, pieces
+        sealed inside a hole of the main piece are allowed. Robot 1 starts on or
+        next to a tile with robot 2 directly north of it, as SetPolyomino places them. """
+    width, height = dims
+    cells = {tuple(int(i) for i in loc) for loc in tile_set}
+    if not cells:
+        return "there are no tiles"
+    for x, y in sorted(cells):
+        if not (0 <= x < width and 0 <= y < height):
+            return "tile ({}, {}) is off the {}x{} board".format(x, y, width, height)
+        margin = min(x, y, width - 1 - x, height - 1 - y)
+        if margin < MIN_MARGIN:
+            return "tile ({}, {}) is {} cells from the edge of the {}x{} board, {} are needed".format(
+                x, y, margin, width, height, MIN_MARGIN)
+
+    x, y = start1
+    if not (0 <= x < width and 0 <= y < height):
+        return "robot1 start ({}, {}) is off the {}x{} board".format(x, y, width, height)
+    if list(start2) != [x, y + 1]:
+        return "robot2 start ({}, {}) is not directly north of robot1 at ({}, {})".format(
+            start2[0], start2[1], x, y)
+    touching = [(x, y)] + [(x + dx, y + dy) for dx, dy in NEIGHBOURS]
+    home = next((cell for cell in touching if cell in cells), None)
+    if home is None:
+        return "robot1 start ({}, {}) is not on or next to a tile".format(x, y)
+
+    components = Components(cells)
+    if len(components) > 1:
+        main = next(component for component in components if home in component)
+        blocked = np.zeros(dims, dtype=bool)
+        blocked[tuple(np.array(sorted(main)).T)] = True
+        outside = Exterior(blocked)
+        loose = [cell for component in components if component is not main
+                 for cell in component if outside[cell]]
+        if loose:
+            return "tile {} is not connected to the piece robot1 starts on, the tiles are in {} pieces".format(
+                min(loose), len(components))
+    return None
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Background rendering of the bitmap frames around the slider position.
+
+A worker thread rebuilds the tiles of nearby steps from the log with
+MoveLog.GetDelta and renders them with Render.RenderTiles, ahead of the slider
+in the direction it is moving and a few behind. The Tk thread only has to make
+a PhotoImage of a ready frame. Every Request replaces the plan of steps still
+to render, and a frame finished for an older window, size or heatmap is
+thrown away.
+    prefetcher = Prefetch.Prefetcher(ahead=24, behind=8)
+    prefetcher.Request(board, step, (800, 800), direction=1, stride=1)
+    board.Draw(canvas, (800, 800), frame=prefetcher.Get(board, step, (800, 800)))
+"""
+import threading
+
+import numpy as np
+
+import Render
+
+AHEAD = 24 # Frames rendered in the direction the slider is moving
+BEHIND = 8 # Frames rendered the other way
+
+
+class Prefetcher:
+
+    def __init__(self, ahead=AHEAD, behind=BEHIND):
+        self.ahead = ahead
+        self.behind = behind
+        self.condition = threading.Condition() # Guards everything below that both threads use
+        self.run = 0 # Bumped by Clear, the log has been reset
+        self.key = None # (run, window, size, heatmap) the frames are rendered for
+        self.job = None # (run, log, dims, window, size, heat) the worker renders with
+        self.plan = [] # Steps still to render, nearest first
+        self.frames = {} # Step to (ppm, shape, scale)
+        self.thread = None
+        # Worker side, the tiles of the last step it rendered
+        self.tiles = None
+        self.tilesStep = None
+        self.tilesRun = None
+
+
+    def Key(self, board, size):
+        return (self.run, board.GetWindow(), tuple(size), board.heatmap)
+
+
+    def Clear(self):
+        """ Drop every frame, call before the board's log is reset or regenerated """
+        with self.condition:
+            self.run += 1
+            self.key = self.job = None
+            self.plan = []
+            self.frames = {}
+
+
+    def Request(self, board, step, size, direction=1, stride=1):
+        """ Render the frames around step, stride steps apart, mostly in direction (+1 or -1) """
+        key = self.Key(board, size)
+        stride = max(1, int(stride))
+        direction = -1 if direction < 0 else 1
+        count = board.GetMoveCount()
+        plan = [step + direction*stride*i for i in range(1, self.ahead + 1)]
+        plan += [step - direction*stride*i for i in range(1, self.behind + 1)]
+        plan = [s for s in plan if 0 <= s < count]
+        with self.condition:
+            if key != self.key: # New window, size or heatmap, nothing rendered so far fits
+                heat = board.GetHeatmap(board.heatmap) if board.heatmap is not None else None
+                self.key = key
+                self.job = (self.run, board.log, board.size, board.GetWindow(), tuple(size), heat)
+                self.frames = {}
+            wanted = set(plan) | {step}
+            self.frames = {s: frame for s, frame in self.frames.items() if s in wanted}
+            self.plan = [s for s in plan if s not in self.frames]
+            self.condition.notify()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._Work, name="Prefetch", daemon=True)
+            self.thread.start()
+
+
+    def Get(self, board, step, size):
+        """ The (ppm, shape, scale) frame of a step for board.DrawBitmap, None when it is not ready """
+        with self.condition:
+            if self.Key(board, size) != self.key:
+                return None
+            return self.frames.get(step)
+
+
+    def _Work(self):
+        while True:
+            with self.condition:
+                while not self.plan:
+                    self.condition.wait()
+                job = self.job
+                step = self.plan.pop(0)
+            try:
+                frame = self._Render(job, step)
+            except Exception: # The log was reset under us, a newer request follows
+                self.tilesRun = None
+                continue
+            with self.condition:
+                if job is self.job: # Still the window it was rendered for
+                    self.frames[step] = frame
+
+
+    def _Render(self, job, step):
+        run, log, dims, window, size, heat = job
+        if self.tilesRun != run: # Start from the step's snapshot
+            self.tiles = np.zeros(dims, dtype=int)
+            for loc in log.GetStep(step)[0]:
+                self.tiles[loc] = 1
+            self.tilesRun = run
+        else: # Walk from the last rendered step
+            for loc, before, after in log.GetDelta(self.tilesStep, step)["tiles"]:
+                self.tiles[loc] = after
+        self.tilesStep = step
+        image, scale = Render.RenderTiles(self.tiles, window, size, heat)
+        return Render.PPM(image), image.shape, scale
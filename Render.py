@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Bitmap rendering of the tile grid for boards too big to draw cell by cell.
+
+The tiles in a window of the board are turned into one RGB image with NumPy,
+several cells to a pixel when the board is bigger than the view, and shown
+as a single Tk PhotoImage. Everything here except PhotoImage works on plain
+arrays, so frames can be rendered away from the Tk thread.
+    image, scale = Render.RenderTiles(board.tiles, (0, 0, board.width, board.height), (800, 800))
+    photo = Render.PhotoImage(image)
+"""
+import math
+
+import numpy as np
+
+BACKGROUND = (255, 255, 255)
+TILE = (190, 190, 190) # Tk's "gray"
+TILE_EDGE = (0, 0, 0)
+GRID = (192, 192, 192) # The '#c0c0c0' grid lines of Board._DrawGrid
+GRID_MIN_PIXELS = 4 # Smaller cells are drawn without grid lines
+LABEL_PIXELS = 24 # Least distance between axis numbers
+
+
+def HeatColors(heat):
+    """ White to red on a log scale for a grid of counts, returns an (..., 3) uint8 array """
+    scale = np.log1p(heat.astype(float))
+    if scale.max() > 0:
+        scale /= scale.max()
+    colors = np.empty(heat.shape + (3,), dtype=np.uint8)
+    colors[..., 0] = 255
+    colors[..., 1] = (255*(1 - scale)).astype(np.uint8)
+    colors[..., 2] = colors[..., 1]
+    return colors
+
+
+def Downsample(grid, block, reduce):
+    """ Merge block x block cells into one with reduce (np.max for counts, np.any for tiles) """
+    if block == 1:
+        return grid
+    w, h = grid.shape
+    padded = np.zeros((-(-w // block)*block, -(-h // block)*block), dtype=grid.dtype)
+    padded[:w, :h] = grid
+    return reduce(padded.reshape(padded.shape[0]//block, block, padded.shape[1]//block, block), axis=(1, 3))
+
+
+def RenderTiles(tiles, window, size, heat=None):
+    """ Render the cells window = (u0, v0, u1, v1) of the tiles to fit in size = (width, height) pixels.
+        Returns an (rows, columns, 3) uint8 image with north up and the pixels per cell, which is
+        below 1 when blocks of cells share a pixel. A tile anywhere in a block fills the block. """
+    u0, v0, u1, v1 = window
+    grid = tiles[u0:u1, v0:v1] != 0
+    w, h = grid.shape
+    cell = min(size[0] // w, size[1] // h)
+    block = 1
+    if cell < 1:
+        block = math.ceil(max(w / size[0], h / size[1]))
+        cell = 1
+    grid = Downsample(grid, block, np.any)
+
+    image = np.empty(grid.shape + (3,), dtype=np.uint8)
+    image[...] = BACKGROUND
+    if heat is not None:
+        heat = Downsample(heat[u0:u1, v0:v1], block, np.max)
+        image[heat > 0] = HeatColors(heat)[heat > 0]
+        image[grid] = (image[grid].astype(np.uint16)*np.array(TILE)//255).astype(np.uint8) # Tiles shade the heat
+    else:
+        image[grid] = TILE
+    image = image.transpose(1, 0, 2)[::-1] # Board u,v to image rows, flip the v
+
+    if cell > 1:
+        image = image.repeat(cell, axis=0).repeat(cell, axis=1)
+        if cell >= GRID_MIN_PIXELS:
+            tile = grid.T[::-1].repeat(cell, axis=0).repeat(cell, axis=1)
+            edges = np.zeros(tile.shape, dtype=bool) # Tiles are outlined one pixel in, as Draw does
+            edges[1::cell] = edges[cell-1::cell] = True
+            edges[:, 1::cell] = edges[:, cell-1::cell] = True
+            image[edges & tile] = TILE_EDGE
+            image[::cell] = GRID # Grid lines on the top and left pixels of each cell
+            image[:, ::cell] = GRID
+    return image, cell / block
+
+
+def LabelStep(scale):
+    """ Cells between axis numbers so they stay LABEL_PIXELS apart, a 1, 2, 5 series """
+    step = 1
+    while step*scale < LABEL_PIXELS:
+        step = step*5//2 if str(step)[0] == "2" else step*2
+    return step
+
+
+def PPM(image):
+    """ Binary PPM of an image, Tk reads it without PIL """
+    return "P6 {} {} 255\n".format(image.shape[1], image.shape[0]).encode() + image.tobytes()
+
+
+def PhotoImage(image, master=None):
+    """ A Tk PhotoImage of an image or its PPM bytes, call from the Tk thread """
+    import tkinter
+    data = image if isinstance(image, bytes) else PPM(image)
+    return tkinter.PhotoImage(master=master, data=data, format="PPM")
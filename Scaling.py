@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Complexity scaling harness for the bounding box automaton.
+
+Runs each polyomino family at geometrically increasing sizes, fits the growth
+exponent of the move counts and flags regressions against a saved baseline.
+
+Usage:
+    python Scaling.py --save scaling.json
+    python Scaling.py --check scaling.json
+"""
+import argparse
+import json
+import sys
+from multiprocessing import Pool
+
+import numpy as np
+
+import Worker
+from MoveLog import CATEGORIES
+
+FAMILIES = ["L", "U", "C", "n", "SQ", u"⊐"]
+SIZES = [2, 4, 8, 16, 32]
+METRICS = ["Total Moves"] + CATEGORIES
+
+EXPONENT_TOLERANCE = 0.1 # Absolute change allowed in a fitted exponent
+CONSTANT_TOLERANCE = 0.25 # Relative change allowed in a fitted constant factor
+
+def _RunShape(name):
+    """ Run one named polyomino and return its size, move counts and status name.
+        The counts are NaN when it did not finish, so the fits leave it out. """
+    import Board
+    board = Worker.GetBoard()
+    board.SetPolyomino(name)
+    tiles = len(board.log.GetStep(0)[0])
+    categories = list(board.finalResults[4])
+    counts = [sum(categories)] + categories
+    if board.status != Board.STATUS.FINISHED:
+        counts = [float("nan")]*len(counts)
+    return name, tiles, counts, board.status.name
+
+
+def ShapeNames(families=FAMILIES, sizes=SIZES):
+    """ The names understood by Board.SetPolyomino for every family and size. """
+    return ["{}{:02d}".format(family, size) for family in families for size in sizes]
+
+
+def RunShapes(names, processes=None):
+    """ Run the shapes in parallel, returns {name: (tiles, [total, cat0..cat3], status name)} """
+    with Pool(processes, initializer=Worker.Init) as pool:
+        return {name: (tiles, counts, status) for name, tiles, counts, status in pool.imap_unordered(_RunShape, names)}
+
+
+def FitPowerLaw(sizes, values):
+    """ Least squares fit of values = constant * sizes**exponent in log-log space.
+        Sizes with a zero count are left out, returns (nan, nan) when fewer than two remain. """
+    sizes = np.asarray(sizes, dtype=float)
+    values = np.asarray(values, dtype=float)
+    keep = (sizes > 0) & (values > 0)
+    if np.count_nonzero(keep) < 2:
+        return float("nan"), float("nan")
+    exponent, intercept = np.polyfit(np.log(sizes[keep]), np.log(values[keep]), 1)
+    return float(exponent), float(np.exp(intercept))
+
+
+def FitFamilies(runs, families=FAMILIES, sizes=SIZES):
+    """ Fit every metric of every family, returns {family: {metric: {"exponent", "constant"}}} """
+    fits = {}
+    for family in families:
+        names = ShapeNames([family], sizes)
+        tiles = [runs[name][0] for name in names]
+        counts = np.array([runs[name][1] for name in names])
+        fits[family] = {}
+        for column, metric in enumerate(METRICS):
+            exponent, constant = FitPowerLaw(tiles, counts[:, column])
+            fits[family][metric] = {"exponent": exponent, "constant": constant}
+    return fits
+
+
+def FindRegressions(fits, baseline, exponentTolerance=EXPONENT_TOLERANCE, constantTolerance=CONSTANT_TOLERANCE):
+    """ Compare the fits against a baseline, returns a list of readable messages. """
+    regressions = []
+    for family, metrics in baseline.items():
+        for metric, old in metrics.items():
+            new = fits.get(family, {}).get(metric)
+            if new is None:
+                continue
+            if np.isnan(old["exponent"]) and np.isnan(new["exponent"]):
+                continue
+            if not abs(new["exponent"] - old["exponent"]) <= exponentTolerance:
+                regressions.append("{} {}: exponent {:.3f} -> {:.3f}".format(
+                    family, metric, old["exponent"], new["exponent"]))
+            elif not abs(new["constant"] - old["constant"]) <= constantTolerance*old["constant"]:
+                regressions.append("{} {}: constant {:.3f} -> {:.3f}".format(
+                    family, metric, old["constant"], new["constant"]))
+    return regressions
+
+
+def PrintFits(fits):
+    print("{:<6}{:<16}{:>10}{:>12}".format("Family", "Metric", "Exponent", "Constant"))
+    print("="*44)
+    for family, metrics in fits.items():
+        for metric, fit in metrics.items():
+            print("{:<6}{:<16}{:>10.3f}{:>12.3f}".format(family, metric, fit["exponent"], fit["constant"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit move count growth exponents per polyomino family.")
+    parser.add_argument("--families", nargs="+", default=FAMILIES)
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--save", help="Write the fitted exponents to this baseline file")
+    parser.add_argument("--check", help="Compare the fitted exponents against this baseline file")
+    parser.add_argument("--exponent-tolerance", type=float, default=EXPONENT_TOLERANCE)
+    parser.add_argument("--constant-tolerance", type=float, default=CONSTANT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    runs = RunShapes(ShapeNames(args.families, args.sizes), args.processes)
+    for name, (tiles, counts, status) in sorted(runs.items()):
+        if status != "FINISHED":
+            print("Left out of the fits: {} {}".format(name, status))
+    fits = FitFamilies(runs, args.families, args.sizes)
+    PrintFits(fits)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(fits, f, indent=2, ensure_ascii=False)
+
+    if args.check:
+        with open(args.check, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = FindRegressions(fits, baseline, args.exponent_tolerance, args.constant_tolerance)
+        for message in regressions:
+            print("REGRESSION", message)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Local simulation service.
+
+Clients send one JSON request per line over localhost TCP or a Unix socket and
+get the per step deltas and the final results back as JSON lines while the
+simulation runs in a process pool. Identical requests share one simulation,
+late joiners are replayed everything produced so far.
+
+Requests:
+    {"poly": "L08"}
+    {"tiles": [[4, 4], [5, 4]], "start1": [4, 4], "start2": [4, 5], "dims": [16, 16]}
+Replies, in order:
+    {"type": "start", "name": ..., "dims": [w, h], "tiles": [[x, y], ...], "robot1": [x, y, heading, state], "robot2": ...}
+    {"type": "steps", "steps": [{"step": s, "robot1": ..., "robot2": ..., "events": [[kind, x, y], ...], "counters": [...]}, ...]}
+    {"type": "result", "status": "FINISHED", "message": "", "steps": n, "results": [moves, placed, picked, [categories]]}
+or {"type": "error", "message": ...} when the request cannot be run.
+
+Usage:
+    python SimServer.py serve --port 8765
+    python SimServer.py loadtest --port 8765 --clients 8 --repeat 4 L08 SQ16 C08
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import Worker
+
+HOST = "127.0.0.1"
+PORT = 8765
+BATCH_STEPS = 256 # Steps sent per message
+BATCH_SECONDS = 0.05 # Or sooner when a batch has waited this long
+CACHE_SIZE = 256 # Finished jobs kept around for identical requests
+CACHE_BYTES = 64*1024*1024 # Most reply bytes the finished jobs may hold between them
+
+def RobotState(robot):
+    return [robot.x, robot.y, robot.heading, robot.state.name]
+
+
+def JsonRobot(state):
+    """ A Board.Stream robot tuple as JSON """
+    x, y, heading, robotState = state
+    return [x, y, heading, robotState.name]
+
+
+def _Simulate(key, request, queue):
+    """ Worker side, run one request and put (key, message) on the queue as the steps are produced """
+    board = Worker.GetBoard()
+    try:
+        if "poly" in request:
+            board.SetPolyomino(request["poly"], generate=False)
+        else:
+            board.SetTiles([tuple(loc) for loc in request["tiles"]], list(request["start1"]),
+                           list(request["start2"]), tuple(request["dims"]), request.get("name", "custom"),
+                           generate=False)
+    except Exception as e:
+        queue.put((key, {"type": "error", "message": str(e)}))
+        queue.put((key, None))
+        return
+
+    log = board.log
+    queue.put((key, {"type": "start", "name": board.name, "dims": list(board.size), "tiles": log.GetStep(0)[0],
+                     "robot1": RobotState(board.robot1), "robot2": RobotState(board.robot2)}))
+
+    batch, sent = [], time.monotonic()
+    for delta in board.Stream(record=False):
+        results = delta["results"]
+        batch.append({"step": delta["step"],
+                      "robot1": JsonRobot(delta["robot1"]), "robot2": JsonRobot(delta["robot2"]),
+                      "events": [[kind, int(loc[0]), int(loc[1])] for kind, loc in delta["events"]],
+                      "counters": results[1:4] + results[4]})
+        if len(batch) >= BATCH_STEPS or time.monotonic() - sent >= BATCH_SECONDS:
+            queue.put((key, {"type": "steps", "steps": batch}))
+            batch, sent = [], time.monotonic()
+
+    if batch:
+        queue.put((key, {"type": "steps", "steps": batch}))
+    queue.put((key, {"type": "result", "status": board.status.name, "message": board.statusMessage,
+                     "steps": log.currentStep, "results": board.results[1:]}))
+    queue.put((key, None))
+
+
+class Job:
+
+    def __init__(self):
+        self.lines = [] # Every reply so far as an encoded JSON line, replayed to late joiners
+        self.bytes = 0
+        self.subscribers = set()
+        self.done = False
+
+
+class SimServer:
+
+    def __init__(self, processes=None):
+        self.processes = processes
+        self.jobs = OrderedDict() # Request key to Job, oldest first
+
+
+    async def Start(self, host=HOST, port=PORT, unix=None):
+        self.loop = asyncio.get_running_loop()
+        self.manager = multiprocessing.Manager()
+        self.queue = self.manager.Queue()
+        self.pool = ProcessPoolExecutor(self.processes)
+        self.collector = threading.Thread(target=self._Collect, daemon=True)
+        self.collector.start()
+        if unix:
+            return await asyncio.start_unix_server(self.HandleClient, path=unix)
+        return await asyncio.start_server(self.HandleClient, host, port)
+
+
+    def Stop(self):
+        self.queue.put(None)
+        self.pool.shutdown(cancel_futures=True)
+        self.manager.shutdown()
+
+
+    def _Collect(self):
+        """ Thread that hands the worker messages over to the event loop """
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            self.loop.call_soon_threadsafe(self._Deliver, *item)
+
+
+    def _Deliver(self, key, message):
+        job = self.jobs.get(key)
+        if job is None or job.done:
+            return
+        if message is None:
+            job.done = True
+            self._Trim()
+            line = None
+        else:
+            line = (json.dumps(message) + "\n").encode() # Once, however many subscribers there are
+            job.lines.append(line)
+            job.bytes += len(line)
+        for subscriber in job.subscribers:
+            subscriber.put_nowait(line)
+        if job.done:
+            job.subscribers.clear()
+
+
+    def _Failed(self, key, future):
+        """ A worker that died never sends its final messages, finish the job here """
+        if future.cancelled() or future.exception() is not None:
+            self._Deliver(key, {"type": "error", "message": "worker failed: {}".format(
+                "cancelled" if future.cancelled() else future.exception())})
+            self._Deliver(key, None)
+
+
+    def _Trim(self):
+        """ Drop the oldest finished jobs until at most CACHE_SIZE holding CACHE_BYTES are left """
+        done = [key for key, job in self.jobs.items() if job.done]
+        total = sum(self.jobs[key].bytes for key in done)
+        for i, key in enumerate(done):
+            if len(done) - i <= CACHE_SIZE and total <= CACHE_BYTES:
+                break
+            total -= self.jobs.pop(key).bytes
+
+
+    def Submit(self, request):
+        """ Start or join the simulation for a request, returns a queue of its encoded reply lines ending in None """
+        key = json.dumps(request, sort_keys=True)
+        job = self.jobs.get(key)
+        if job is None:
+            job = self.jobs[key] = Job()
+            future = self.loop.run_in_executor(self.pool, _Simulate, key, request, self.queue)
+            future.add_done_callback(lambda f: self._Failed(key, f))
+        else:
+            self.jobs.move_to_end(key)
+
+        subscriber = asyncio.Queue()
+        for line in job.lines:
+            subscriber.put_nowait(line)
+        if job.done:
+            subscriber.put_nowait(None)
+        else:
+            job.subscribers.add(subscriber)
+        return subscriber
+
+
+    async def HandleClient(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict) or not ("poly" in request or "tiles" in request):
+                        raise ValueError("expected an object with poly or tiles")
+                except ValueError as e:
+                    writer.write((json.dumps({"type": "error", "message": str(e)}) + "\n").encode())
+                    await writer.drain()
+                    continue
+                subscriber = self.Submit(request)
+                while True:
+                    line = await subscriber.get()
+                    if line is None:
+                        break
+                    writer.write(line)
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def Simulate(request, host=HOST, port=PORT, unix=None):
+    """ Client side, an async generator of the reply messages for one request """
+    if unix:
+        reader, writer = await asyncio.open_unix_connection(unix)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write((json.dumps(request) + "\n").encode())
+        await writer.drain()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            yield message
+            if message["type"] in ("result", "error"):
+                break
+    finally:
+        writer.close()
+
+
+async def LoadTest(requests, clients=8, host=HOST, port=PORT, unix=None):
+    """ Push the requests through the server from several clients at once and report the throughput """
+    pending = asyncio.Queue()
+    for request in requests:
+        pending.put_nowait(request)
+    latencies, firstSteps, totals = [], [], {"steps": 0, "errors": 0}
+
+    async def Client():
+        while not pending.empty():
+            request = pending.get_nowait()
+            start = time.monotonic()
+            first = None
+            async for message in Simulate(request, host, port, unix):
+                if message["type"] == "steps":
+                    if first is None:
+                        first = time.monotonic() - start
+                    totals["steps"] += len(message["steps"])
+                elif message["type"] == "error" or message.get("status") == "ERROR":
+                    totals["errors"] += 1
+            latencies.append(time.monotonic() - start)
+            if first is not None:
+                firstSteps.append(first)
+
+    start = time.monotonic()
+    await asyncio.gather(*[Client() for i in range(clients)])
+    elapsed = time.monotonic() - start
+    print("Requests: {} from {} clients in {:.2f}s".format(len(latencies), clients, elapsed))
+    print("Throughput: {:.1f} requests/s, {:.0f} steps/s".format(len(latencies)/elapsed, totals["steps"]/elapsed))
+    if latencies:
+        print("Latency: mean {:.3f}s, max {:.3f}s".format(sum(latencies)/len(latencies), max(latencies)))
+    if firstSteps:
+        print("First steps after: mean {:.3f}s".format(sum(firstSteps)/len(firstSteps)))
+    print("Errors: {}".format(totals["errors"]))
+
+
+async def Serve(args):
+    server = SimServer(args.processes)
+    listener = await server.Start(args.host, args.port, args.unix)
+    print("Serving on {}".format(args.unix or "{}:{}".format(args.host, args.port)))
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.Stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local simulation service for the tile robots.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--unix", help="Listen on or connect to this Unix socket instead of TCP")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve")
+    serve.add_argument("--processes", type=int, default=None)
+    loadtest = commands.add_parser("loadtest")
+    loadtest.add_argument("--clients", type=int, default=8)
+    loadtest.add_argument("--repeat", type=int, default=1, help="Send every polyomino this many times")
+    loadtest.add_argument("polys", nargs="+")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "serve":
+            asyncio.run(Serve(args))
+        else:
+            requests = [{"poly": poly} for i in range(args.repeat) for poly in args.polys]
+            asyncio.run(LoadTest(requests, args.clients, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
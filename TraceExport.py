@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar export of a full simulation run to a compressed .npz file and the
+matching loaders for aggregating many runs with NumPy.
+"""
+import numpy as np
+
+import Board
+import MoveLog
+
+TRACE_VERSION = 2 # 2 added eventPrevious, so a trace steps backwards like the log
+STEP_COLUMNS = MoveLog.STEP_COLUMNS
+
+
+def StateNames():
+    """ STATE names indexed by their value, so stateNames[robotStates] gives the names. """
+    names = [""]*(max(state.value for state in Board.STATE) + 1)
+    for state in Board.STATE:
+        names[state.value] = state.name
+    return np.array(names)
+
+
+def ExportTrace(board, path):
+    """ Write the run held in the board's log to path as compressed columns. """
+    log = board.log
+    eventSteps, eventKinds, eventCells = log.GetEvents()
+    np.savez_compressed(path,
+                        version=TRACE_VERSION,
+                        name=getattr(board, "name", ""),
+                        dims=np.array(board.size),
+                        initialTiles=np.array(log.GetStep(0)[0], dtype=np.int32).reshape(-1, 2),
+                        counterColumns=np.array(MoveLog.COUNTER_COLUMNS),
+                        stateNames=StateNames(),
+                        counters=log.GetCounters(),
+                        robotPositions=log.GetRobotPositions(),
+                        robotHeadings=log.GetRobotHeadings(),
+                        robotStates=log.GetRobotStates(),
+                        eventSteps=eventSteps,
+                        eventKinds=eventKinds,
+                        eventCells=eventCells,
+                        eventPrevious=log.GetEventPrevious())
+
+
+def LoadTrace(path):
+    """ Load one exported run as a dict of arrays. """
+    with np.load(path) as data:
+        trace = {key: data[key] for key in data.files}
+    if int(trace["version"]) != TRACE_VERSION:
+        raise ValueError("Unsupported trace version {} in {}".format(int(trace["version"]), path))
+    trace["name"] = str(trace["name"])
+    return trace
+
+
+def LoadTraces(paths):
+    """ Load and concatenate many runs.
+
+        The per step and per event columns are stacked end to end, "stepRun" and
+        "eventRun" give the index of the run each row came from and "names" the
+        polyomino of each run.
+    """
+    traces = [LoadTrace(path) for path in paths]
+    result = {"names": np.array([trace["name"] for trace in traces]),
+              "counterColumns": traces[0]["counterColumns"] if traces else np.array(MoveLog.COUNTER_COLUMNS),
+              "stateNames": traces[0]["stateNames"] if traces else StateNames()}
+    for key in STEP_COLUMNS + MoveLog.EVENT_COLUMNS:
+        result[key] = np.concatenate([trace[key] for trace in traces]) if traces else np.zeros(0)
+    result["stepRun"] = np.repeat(np.arange(len(traces)), [len(trace["counters"]) for trace in traces])
+    result["eventRun"] = np.repeat(np.arange(len(traces)), [len(trace["eventSteps"]) for trace in traces])
+    return result
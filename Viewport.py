@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Zoom and pan state for the board canvas.
+
+The viewport is a square window of span cells around a centre cell. Fitted,
+it shows the whole board. Board.Draw only draws the cells in board.view:
+    viewport.Reset(board.size)
+    viewport.Zoom(2)
+    board.view = viewport.Window()
+"""
+MIN_SPAN = 4 # Fewest cells across when zoomed all the way in
+
+
+class Viewport:
+
+    def __init__(self, dims=(16, 16)):
+        self.Reset(dims)
+
+
+    def Reset(self, dims):
+        """ Fit a new board """
+        self.dims = tuple(dims)
+        self.Fit()
+
+
+    def Fit(self):
+        """ Show the whole board """
+        self.fitted = True
+        self.span = max(self.dims)
+        self.center = (self.dims[0]/2, self.dims[1]/2)
+
+
+    def Origin(self):
+        """ The bottom left cell of the window, kept on the board where it fits """
+        u0 = min(max(0, self.center[0] - self.span/2), max(0, self.dims[0] - self.span))
+        v0 = min(max(0, self.center[1] - self.span/2), max(0, self.dims[1] - self.span))
+        return u0, v0
+
+
+    def Window(self):
+        """ The cells (u0, v0, u1, v1) to draw, None when fitted """
+        if self.fitted:
+            return None
+        u0, v0 = (int(i) for i in self.Origin())
+        return (u0, v0, u0 + self.span, v0 + self.span)
+
+
+    def CellAt(self, x, y, size, offset):
+        """ The cell under canvas point (x, y) """
+        u0, v0 = self.Origin()
+        scale = min(size) / self.span
+        return u0 + (x - offset) / scale, v0 + self.span - (y - offset) / scale # Flip the y
+
+
+    def Zoom(self, factor, cell=None):
+        """ Zoom in by factor (below 1 zooms out) keeping the given cell where it is on screen """
+        span = max(MIN_SPAN, int(round(self.span / factor)))
+        if span >= max(self.dims):
+            self.Fit()
+            return
+        u, v = cell if cell is not None else self.center
+        u0, v0 = self.Origin()
+        fx, fy = (u - u0) / self.span, (v - v0) / self.span
+        self.center = (u - fx*span + span/2, v - fy*span + span/2)
+        self.span = span
+        self.fitted = False
+
+
+    def Pan(self, du, dv):
+        """ Move the window by du, dv cells """
+        if self.fitted:
+            return
+        u0, v0 = self.Origin() # Drop any overshoot past the board edge first
+        self.center = (u0 + self.span/2 + du, v0 + self.span/2 + dv)
+
+
+    def Follow(self, u, v):
+        """ Centre the window on a cell, the whole board stays in view when fitted """
+        if not self.fitted:
+            self.center = (u + 0.5, v + 0.5)
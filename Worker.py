@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+One quiet Board per worker process for the batch tools.
+
+Pools start their workers with Init, which can set board attributes such as
+a checker or a time limit, and the work functions ask for the board with
+GetBoard. Board is imported on first use, so a worker that changed sys.path
+first gets the Board found there.
+    with Pool(processes, initializer=Worker.Init, initargs=({"timeLimit": 10},)) as pool:
+        ...
+    board = Worker.GetBoard()
+"""
+import contextlib
+import io
+
+_board = None # This process's board
+
+
+def Init(attributes=None):
+    """ Make this process's board, verbose off and the given {name: value} attributes set """
+    global _board
+    with contextlib.redirect_stdout(io.StringIO()): # Board() generates and prints a first board
+        import Board
+        _board = Board.Board()
+    _board.verbose = False
+    for name, value in (attributes or {}).items():
+        setattr(_board, name, value)
+    return _board
+
+
+def GetBoard():
+    """ This process's board, made with Init on first use """
+    if _board is None:
+        Init()
+    return _board